@@ -0,0 +1,468 @@
+"""
+Microbenchmarks - FAISSVectorStore and DatabaseManager on Synthetic Corpora
+
+Each (size, index type) case runs in a fresh process, so peak RSS is per
+case. Results are written as JSON (one file per run) and can be compared
+with an earlier run:
+    
+    python benchmark.py --sizes 10000 100000
+    python benchmark.py --sizes 1000000 --index-types flat hnsw --skip-sqlite
+    python benchmark.py --baseline benchmark_results/<earlier>.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DOCUMENT_TYPES = ("policy", "claims", "contract", "general")
+SECTIONS = ("coverage", "exclusions", "definitions", "conditions", "claims", "schedule", "general")
+VOCABULARY = (
+    "policy insured coverage premium deductible claim liability endorsement clause exclusion "
+    "limit period renewal beneficiary damage property vehicle incident notice settlement amount "
+    "schedule insurer agreement party termination payment invoice contract obligation warranty"
+).split()
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p99/mean of latency samples, in milliseconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'mean_ms': round(float(values.mean()), 4)
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def synthetic_corpus(
+    size: int,
+    dimension: int,
+    chunks_per_document: int,
+    batch_size: int,
+    seed: int
+) -> Iterator[Tuple[np.ndarray, List[Dict]]]:
+    """
+    Yield (normalized float32 vectors, chunk metadata) batches
+    
+    Vectors are generated per batch so a 1M x 1536 corpus never sits in
+    memory twice. Metadata mirrors what ingestion stores: document ID and
+    type, chunk index, ~60 words of text and a token count.
+    """
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        vectors = rng.standard_normal((count, dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        metadata = []
+        for i in range(start, start + count):
+            document = i // chunks_per_document
+            text = " ".join(words.choice(VOCABULARY) for _ in range(60)) + f" ref {i:08d}"
+            metadata.append({
+                'id': f"chunk-doc-{document:07d}-{i % chunks_per_document}",
+                'document_id': f"doc-{document:07d}",
+                'document_type': DOCUMENT_TYPES[document % len(DOCUMENT_TYPES)],
+                'chunk_index': i % chunks_per_document,
+                'text': text,
+                'tokens': len(text) // 4,
+                'section': SECTIONS[i % len(SECTIONS)]
+            })
+        yield vectors, metadata
+
+
+def default_nlist(size: int, index_type: str) -> Optional[int]:
+    """
+    IVF cell count for a corpus: ~4 * sqrt(size), capped so the store's
+    training threshold (39 vectors per cell) is reached by the corpus
+    """
+    if not index_type.startswith("ivf"):
+        return None
+    return max(1, min(int(4 * size ** 0.5), size // 39))
+
+
+def random_queries(count: int, dimension: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    queries = rng.standard_normal((count, dimension), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def bench_vector_store(config: Dict, workdir: str) -> Dict:
+    """Add throughput, search latency (filtered and unfiltered), checkpoint and load time"""
+    from vector_store import FAISSVectorStore
+    
+    size = config['size']
+    options = {'nlist': config['nlist']} if config['nlist'] else {}
+    index_path = os.path.join(workdir, "faiss")
+    store = FAISSVectorStore(
+        dimension=config['dimension'],
+        index_path=index_path,
+        index_type=config['index_type'],
+        name="bench",
+        **options
+    )
+    
+    add_seconds = 0.0
+    for vectors, metadata in synthetic_corpus(
+        size, config['dimension'], config['chunks_per_document'], config['add_batch'], config['seed']
+    ):
+        started = time.perf_counter()
+        store.add_embeddings(vectors, metadata)
+        add_seconds += time.perf_counter() - started
+    
+    documents = max(1, size // config['chunks_per_document'])
+    picker = random.Random(config['seed'])
+    queries = random_queries(config['queries'], config['dimension'], config['seed'])
+    top_k = config['top_k']
+    
+    def timed_searches(filter_size: Optional[int]) -> Dict:
+        samples = []
+        for query in queries:
+            document_ids = None
+            if filter_size:
+                document_ids = [f"doc-{picker.randrange(documents):07d}" for _ in range(filter_size)]
+            started = time.perf_counter()
+            store.search(query.reshape(1, -1), top_k=top_k, document_ids=document_ids)
+            samples.append(time.perf_counter() - started)
+        return percentiles(samples)
+    
+    store.search(queries[0].reshape(1, -1), top_k=top_k)  # warm-up
+    search = {
+        'unfiltered': timed_searches(None),
+        'filter_1_document': timed_searches(1),
+        'filter_10_documents': timed_searches(10)
+    }
+    
+    batch = queries[:config['search_batch']]
+    started = time.perf_counter()
+    store.search_batch(batch, top_k=top_k)
+    batch_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    store.save_index()
+    save_seconds = time.perf_counter() - started
+    stats = store.get_stats()
+    store.metadata.close()
+    store.embeddings.close()
+    del store
+    
+    loaded = FAISSVectorStore(dimension=config['dimension'], index_path=index_path, name="bench", **options)
+    started = time.perf_counter()
+    loaded.load_index()
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded.search(queries[0].reshape(1, -1), top_k=top_k)
+    first_search_seconds = time.perf_counter() - started
+    
+    disk_bytes = sum(
+        os.path.getsize(os.path.join(index_path, name)) for name in os.listdir(index_path)
+    )
+    return {
+        'index_type': stats['index_type'],
+        'is_trained': stats['is_trained'],
+        'total_vectors': stats['total_vectors'],
+        'add_seconds': round(add_seconds, 3),
+        'add_vectors_per_second': round(size / add_seconds, 1) if add_seconds else None,
+        'search': search,
+        'search_batch': {
+            'queries': len(batch),
+            'seconds': round(batch_seconds, 4),
+            'queries_per_second': round(len(batch) / batch_seconds, 1) if batch_seconds else None
+        },
+        'save_index_seconds': round(save_seconds, 3),
+        'load_index_seconds': round(load_seconds, 3),
+        'first_search_after_load_ms': round(first_search_seconds * 1000, 4),
+        'disk_mb': round(disk_bytes / (1024 * 1024), 1)
+    }
+
+
+def bench_sqlite(config: Dict, workdir: str) -> Dict:
+    """Document/chunk insert rates and chunk, FTS and query log read latency"""
+    from sqllite import DatabaseManager, QueryLog
+    
+    size = config['sqlite_rows']
+    chunks_per_document = config['chunks_per_document']
+    db = DatabaseManager(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    
+    documents = max(1, (size + chunks_per_document - 1) // chunks_per_document)
+    started = time.perf_counter()
+    for start in range(0, documents, 1000):
+        db.create_documents([
+            {
+                'id': f"doc-{d:07d}",
+                'filename': f"document-{d}.pdf",
+                'file_type': 'pdf',
+                'document_type': DOCUMENT_TYPES[d % len(DOCUMENT_TYPES)],
+                'status': 'indexed',
+                'processed': True
+            }
+            for d in range(start, min(documents, start + 1000))
+        ])
+    documents_seconds = time.perf_counter() - started
+    
+    # One create_chunks call per document, as ingestion does
+    chunk_seconds = 0.0
+    for _, metadata in synthetic_corpus(size, 1, chunks_per_document, chunks_per_document, config['seed']):
+        rows = [
+            {
+                'id': m['id'],
+                'document_id': m['document_id'],
+                'chunk_index': m['chunk_index'],
+                'text': m['text'],
+                'enriched_text': f"[{m['document_type']}] {m['text']}",
+                'tokens': m['tokens'],
+                'embedding_id': m['id'],
+                'quality_score': 0.5,
+                'section': m['section']
+            }
+            for m in metadata
+        ]
+        started = time.perf_counter()
+        db.create_chunks(rows)
+        chunk_seconds += time.perf_counter() - started
+    
+    picker = random.Random(config['seed'])
+    samples = []
+    for _ in range(config['queries']):
+        document_id = f"doc-{picker.randrange(documents):07d}"
+        started = time.perf_counter()
+        db.get_chunks_by_document(document_id)
+        samples.append(time.perf_counter() - started)
+    chunks_by_document = percentiles(samples)
+    
+    fts_samples = []
+    for i in range(config['queries']):
+        query = " ".join(picker.choice(VOCABULARY) for _ in range(4)) + f" {picker.randrange(size):08d}"
+        started = time.perf_counter()
+        db.search_chunks_fts(query, limit=config['top_k'] * 2)
+        fts_samples.append(time.perf_counter() - started)
+    
+    log_rows = [
+        {
+            'id': f"log-{i}",
+            'query': "what is covered",
+            'approach': ('standard', 'truecontext')[i % 2],
+            'model': 'gpt-4.1-mini',
+            'document_ids': [f"doc-{i % documents:07d}"],
+            'response': "synthetic answer",
+            'tokens_input': 900,
+            'tokens_output': 120,
+            'cost': 0.001,
+            'latency': 0.5 + (i % 100) / 50,
+            'timestamp': datetime.utcnow()
+        }
+        for i in range(config['log_rows'])
+    ]
+    started = time.perf_counter()
+    for start in range(0, len(log_rows), 200):
+        db.bulk_insert(QueryLog, log_rows[start:start + 200])
+    log_seconds = time.perf_counter() - started
+    
+    metrics_samples = []
+    for _ in range(20):
+        started = time.perf_counter()
+        db.get_query_metrics(24)
+        metrics_samples.append(time.perf_counter() - started)
+    
+    db.engine.dispose()
+    return {
+        'chunks': size,
+        'documents': documents,
+        'documents_per_second': round(documents / documents_seconds, 1) if documents_seconds else None,
+        'chunk_inserts_per_second': round(size / chunk_seconds, 1) if chunk_seconds else None,
+        'get_chunks_by_document': chunks_by_document,
+        'search_chunks_fts': percentiles(fts_samples),
+        'query_log_inserts_per_second': round(len(log_rows) / log_seconds, 1) if log_seconds else None,
+        'get_query_metrics': percentiles(metrics_samples),
+        'db_mb': round(os.path.getsize(os.path.join(workdir, 'bench.db')) / (1024 * 1024), 1)
+    }
+
+
+def run_case(config: Dict) -> Dict:
+    """One corpus size and index type (runs in its own process)"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="truecontext-bench-", dir=config['workdir'])
+    try:
+        result = {'size': config['size'], 'index_spec': config['index_type']}
+        started = time.perf_counter()
+        result['vector_store'] = bench_vector_store(config, workdir)
+        if not result['vector_store']['is_trained']:
+            # Too few vectors to train: every number measured the flat staging index
+            result['index_spec'] = f"{config['index_type']}/untrained-staging"
+        if config['sqlite_rows']:
+            result['sqlite'] = bench_sqlite(config, workdir)
+        result['wall_seconds'] = round(time.perf_counter() - started, 2)
+        result['peak_rss_mb'] = peak_rss_mb()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment() -> Dict:
+    import faiss
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'faiss': getattr(faiss, '__version__', 'unknown'),
+        'faiss_threads': faiss.omp_get_max_threads()
+    }
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """Lines describing the change of headline numbers against a baseline run"""
+    previous = {(r['size'], r['index_spec']): r for r in baseline.get('results', [])}
+    headline = [
+        ('vector_store', 'add_vectors_per_second', True),
+        ('vector_store', 'search.unfiltered.p50_ms', False),
+        ('vector_store', 'search.unfiltered.p99_ms', False),
+        ('vector_store', 'search.filter_10_documents.p99_ms', False),
+        ('vector_store', 'load_index_seconds', False),
+        ('sqlite', 'chunk_inserts_per_second', True),
+        ('sqlite', 'search_chunks_fts.p99_ms', False),
+        (None, 'peak_rss_mb', False)
+    ]
+    
+    def lookup(result: Dict, section: Optional[str], path: str):
+        value = result.get(section, {}) if section else result
+        for part in path.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+    
+    lines = []
+    for result in results['results']:
+        before = previous.get((result['size'], result['index_spec']))
+        if before is None:
+            continue
+        for section, path, higher_is_better in headline:
+            new, old = lookup(result, section, path), lookup(before, section, path)
+            if not new or not old:
+                continue
+            change = (new - old) / old * 100
+            better = change > 0 if higher_is_better else change < 0
+            label = f"{section}.{path}" if section else path
+            lines.append(
+                f"{result['size']:>9} {result['index_spec']:<8} {label:<45} "
+                f"{old:>12.4f} -> {new:>12.4f} ({change:+.1f}%{', better' if better else ''})"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="corpus sizes in vectors (e.g. 10000 100000 1000000)")
+    parser.add_argument("--index-types", nargs="+", default=["flat"], help="flat, ivf_flat, hnsw and/or ivf_pq")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default: 4 * sqrt(size), at most size / 39)")
+    parser.add_argument("--chunks-per-document", type=int, default=20)
+    parser.add_argument("--add-batch", type=int, default=1000, help="vectors per add_embeddings call")
+    parser.add_argument("--queries", type=int, default=200, help="timed searches per case")
+    parser.add_argument("--search-batch", type=int, default=64, help="queries in the search_batch measurement")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--sqlite-rows", type=int, default=None, help="chunks inserted into SQLite (default: size, capped at 200000)")
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument("--log-rows", type=int, default=20000, help="query log rows bulk inserted")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="scratch directory (default: system temp)")
+    parser.add_argument("--output", default=None, help="result file (default: benchmark_results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    args = parser.parse_args()
+    
+    started_at = datetime.utcnow()
+    output = args.output or os.path.join("benchmark_results", f"{started_at:%Y%m%dT%H%M%S}.json")
+    results = {
+        'started_at': started_at.isoformat(),
+        'environment': environment(),
+        'config': vars(args),
+        'results': []
+    }
+    
+    # spawn: every case starts from an empty heap, so peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        for index_type in args.index_types:
+            config = {
+                'size': size,
+                'index_type': index_type,
+                'dimension': args.dimension,
+                'nlist': args.nlist or default_nlist(size, index_type),
+                'chunks_per_document': args.chunks_per_document,
+                'add_batch': args.add_batch,
+                'queries': args.queries,
+                'search_batch': args.search_batch,
+                'top_k': args.top_k,
+                # SQLite does not depend on the index type; measure it once per size
+                'sqlite_rows': 0 if args.skip_sqlite or index_type != args.index_types[0]
+                else (args.sqlite_rows or min(size, 200000)),
+                'log_rows': args.log_rows,
+                'seed': args.seed,
+                'workdir': args.workdir
+            }
+            print(f"Running {index_type} at {size} vectors...", flush=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, config).result()
+            results['results'].append(result)
+            
+            vector = result['vector_store']
+            if not vector['is_trained']:
+                print(f"  {index_type} did not train at {size} vectors; reported as {result['index_spec']}", flush=True)
+            print(
+                f"  add {vector['add_vectors_per_second']}/s, search p50 {vector['search']['unfiltered']['p50_ms']}ms "
+                f"p99 {vector['search']['unfiltered']['p99_ms']}ms, load {vector['load_index_seconds']}s, "
+                f"peak RSS {result['peak_rss_mb']}MB",
+                flush=True
+            )
+            if 'sqlite' in result:
+                sqlite = result['sqlite']
+                print(
+                    f"  sqlite chunks {sqlite['chunk_inserts_per_second']}/s, "
+                    f"fts p99 {sqlite['search_chunks_fts']['p99_ms']}ms",
+                    flush=True
+                )
+    
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline}:")
+        for line in compare(results, baseline) or ["no matching cases"]:
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Context Packer - Token-Budgeted, Redundancy-Aware Prompt Context
+"""
+import logging
+from typing import List, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_tokens(chunk: Dict) -> int:
+    """Stored token count, or a ~4 characters per token estimate"""
+    tokens = chunk.get('tokens')
+    return int(tokens) if tokens else max(1, len(chunk.get('text', '')) // 4)
+
+
+class ContextPacker:
+    """
+    Selects and arranges retrieved chunks for the prompt
+    
+    1. Maximal marginal relevance over the retrieved set, using the stored
+       chunk embeddings; near-duplicates above dedup_threshold are dropped.
+    2. Chunks are taken in MMR order while they fit in the token budget; a
+       best chunk larger than the whole budget is truncated to it.
+    3. Selected chunks that are chunk_index neighbours in the same document
+       are merged into one passage, in document order.
+    """
+    
+    def __init__(
+        self,
+        vector_store,
+        token_budget: int = 4000,
+        mmr_lambda: float = 0.7,
+        dedup_threshold: float = 0.95
+    ):
+        """
+        Initialize context packer
+        
+        Args:
+            vector_store: Store providing get_result_embeddings for search results
+            token_budget: Default context budget in tokens
+            mmr_lambda: Relevance vs. diversity trade-off (1.0 = relevance only)
+            dedup_threshold: Cosine similarity above which a chunk is redundant
+        """
+        self.vector_store = vector_store
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+    
+    def pack(self, chunks: List[Dict], token_budget: Optional[int] = None) -> Dict:
+        """
+        Pack retrieved chunks into a budgeted context
+        
+        Args:
+            chunks: Search results (with score, tokens, document_id, chunk_index)
+            token_budget: Override for the default budget
+        
+        Returns:
+            Dict with chunks (merged passages, best first), budget_used,
+            budget_total, dropped_redundant and dropped_budget
+        """
+        budget = token_budget or self.token_budget
+        order, redundant = self._mmr_order(chunks)
+        
+        selected = []
+        used = 0
+        for i in order:
+            tokens = chunk_tokens(chunks[i])
+            if used + tokens <= budget:
+                selected.append(chunks[i])
+                used += tokens
+            elif not selected:
+                # Never answer without context: keep the best chunk's prefix
+                selected.append(self._truncate(chunks[i], budget))
+                used = budget
+        
+        passages = self._merge_neighbours(selected)
+        return {
+            'chunks': passages,
+            'budget_used': used,
+            'budget_total': budget,
+            'dropped_redundant': redundant,
+            'dropped_budget': len(order) - len(selected)
+        }
+    
+    def _mmr_order(self, chunks: List[Dict]):
+        """
+        Rank chunks by maximal marginal relevance
+        
+        Returns:
+            (indices in MMR order without redundant chunks, number dropped)
+        """
+        if len(chunks) < 2:
+            return list(range(len(chunks))), 0
+        
+        try:
+            embeddings = np.asarray(self.vector_store.get_result_embeddings(chunks), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Chunk embeddings unavailable, packing by score only: {e}")
+            embeddings = None
+        
+        if embeddings is None or len(embeddings) != len(chunks):
+            # Fall back to exact-text dedup in score order
+            seen = set()
+            order = []
+            for i in sorted(range(len(chunks)), key=lambda i: -chunks[i].get('score', 0)):
+                if chunks[i]['text'] not in seen:
+                    seen.add(chunks[i]['text'])
+                    order.append(i)
+            return order, len(chunks) - len(order)
+        
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        similarity = embeddings @ embeddings.T
+        relevance = np.array([c.get('score', 0.0) for c in chunks], dtype=np.float32)
+        
+        remaining = list(range(len(chunks)))
+        order = []
+        redundant = 0
+        max_sim = np.full(len(chunks), -np.inf, dtype=np.float32)
+        while remaining:
+            if order:
+                mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * max_sim[remaining]
+            else:
+                mmr = relevance[remaining]
+            best = remaining.pop(int(np.argmax(mmr)))
+            if order and max_sim[best] >= self.dedup_threshold:
+                redundant += 1
+                continue
+            order.append(best)
+            max_sim = np.maximum(max_sim, similarity[best])
+        return order, redundant
+    
+    @staticmethod
+    def _truncate(chunk: Dict, budget: int) -> Dict:
+        """Cut a chunk's text to roughly budget tokens, in proportion to its length"""
+        text = chunk.get('text', '')
+        keep = len(text) * budget // chunk_tokens(chunk)
+        return {**chunk, 'text': text[:keep], 'tokens': budget, 'truncated': True}
+    
+    @staticmethod
+    def _merge_neighbours(selected: List[Dict]) -> List[Dict]:
+        """Merge consecutive chunk_index runs per document; passages ordered by best score"""
+        by_document: Dict[str, List[Dict]] = {}
+        for chunk in selected:
+            by_document.setdefault(chunk.get('document_id'), []).append(chunk)
+        
+        passages = []
+        for document_chunks in by_document.values():
+            document_chunks.sort(key=lambda c: (c.get('chunk_index') is None, c.get('chunk_index') or 0))
+            run = [document_chunks[0]]
+            for chunk in document_chunks[1:]:
+                previous = run[-1].get('chunk_index')
+                if previous is not None and chunk.get('chunk_index') == previous + 1:
+                    run.append(chunk)
+                else:
+                    passages.append(ContextPacker._passage(run))
+                    run = [chunk]
+            passages.append(ContextPacker._passage(run))
+        
+        passages.sort(key=lambda p: -p.get('score', 0))
+        return passages
+    
+    @staticmethod
+    def _passage(run: List[Dict]) -> Dict:
+        if len(run) == 1:
+            return {**run[0], 'tokens': chunk_tokens(run[0]), 'chunk_ids': [run[0]['id']]}
+        return {
+            **run[0],
+            'text': "\n".join(c['text'] for c in run),
+            'tokens': sum(chunk_tokens(c) for c in run),
+            'score': max(c.get('score', 0) for c in run),
+            'chunk_ids': [c['id'] for c in run]
+        }
+
+
+# Singleton instance
+context_packer = None
+
+def get_context_packer(vector_store, **options) -> ContextPacker:
+    """Get or create context packer instance"""
+    global context_packer
+    if context_packer is None:
+        context_packer = ContextPacker(vector_store, **options)
+    return context_packer
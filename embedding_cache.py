@@ -0,0 +1,242 @@
+"""
+Embedding Cache - Content-Addressed Vectors in SQLite with an In-Process LRU
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by sha256(model, text)
+    
+    Two tiers: an in-process LRU of recently used vectors in front of a
+    SQLite table. The table is bounded by max_entries; once it grows past
+    that, the least recently used rows are evicted in one batch. Recency on
+    disk is tracked at touch_interval granularity, so hits rarely write.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 200000,
+        memory_entries: int = 10000,
+        touch_interval: float = 3600
+    ):
+        """
+        Initialize embedding cache
+        
+        Args:
+            path: SQLite file holding the cached vectors
+            max_entries: Rows kept on disk (each ~dimension * 4 bytes)
+            memory_entries: Vectors kept in the in-process LRU
+            touch_interval: Seconds before a hit refreshes a row's last_used
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.touch_interval = touch_interval
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used);
+        """)
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+    
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Look up vectors; missing keys come back as None"""
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            pending = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+            
+            if pending:
+                found = {}
+                stale = []
+                now = time.time()
+                unique = list(pending)
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    for key, vector, last_used in self.conn.execute(
+                        f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                    ):
+                        found[key] = vector
+                        if last_used < now - self.touch_interval:
+                            stale.append(key)
+                
+                # Only rows not touched recently are written, so repeated hits
+                # stay read-only and do not contend for the write lock
+                if stale:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in stale]
+                    )
+                    self.conn.commit()
+                
+                for key, positions in pending.items():
+                    blob = found.get(key)
+                    if blob is None:
+                        self.misses += len(positions)
+                        continue
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    self.disk_hits += len(positions)
+                    for i in positions:
+                        results[i] = vector
+        return results
+    
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Store vectors (one row per key)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in zip(keys, vectors)]
+            )
+            self.rows += max(cursor.rowcount, 0)
+            self.conn.commit()
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector.copy())
+            
+            if self.rows > self.max_entries:
+                self._evict()
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def _evict(self):
+        """Drop least recently used rows down to 90% of max_entries"""
+        excess = self.rows - int(self.max_entries * 0.9)
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self.conn.commit()
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Evicted {excess} cached embeddings")
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'entries': self.rows,
+                'memory_entries': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class CachedEmbeddingsService:
+    """
+    Embeddings service wrapper that serves repeated texts from an EmbeddingCache
+    
+    Only cache misses reach the wrapped service; everything else is delegated.
+    """
+    
+    def __init__(self, service, cache: EmbeddingCache, model: Optional[str] = None):
+        """
+        Args:
+            service: Embeddings service with embed_texts / embed_query
+            cache: Backing cache
+            model: Model name mixed into cache keys (defaults to service.model)
+        """
+        self.service = service
+        self.cache = cache
+        self.model = model or getattr(service, 'model', None) or 'default'
+        # Shape embed_query results come back in; learned from the first miss
+        self._query_shape = (1, -1)
+    
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+    
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, calling the service only for texts not seen before"""
+        keys = [EmbeddingCache.key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        
+        # Duplicates within one batch are embedded once
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        
+        if missing:
+            fresh = np.asarray(self.service.embed_texts(list(missing.values())), dtype=np.float32)
+            self.cache.put_many(list(missing), fresh)
+            by_key = dict(zip(missing, fresh.reshape(len(missing), -1)))
+            vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query, serving repeats from the cache"""
+        key = EmbeddingCache.key(self.model, f"query\0{query}")
+        vector = self.cache.get_many([key])[0]
+        if vector is not None:
+            return vector.reshape(self._query_shape).copy()
+        
+        embedding = np.asarray(self.service.embed_query(query), dtype=np.float32)
+        self._query_shape = (-1,) if embedding.ndim == 1 else (1, -1)
+        self.cache.put_many([key], embedding)
+        return embedding
+
+
+# Singleton instance
+embedding_cache = None
+
+def get_embedding_cache(path: str = "./data/embedding_cache.db", **options) -> EmbeddingCache:
+    """Get or create embedding cache instance"""
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(path, **options)
+    return embedding_cache
@@ -0,0 +1,335 @@
+"""
+Fake Azure OpenAI - Local Stand-In for Embeddings and Chat Completions
+
+Serves the Azure OpenAI REST routes the app uses, so main-wo-neo.py can be
+load-tested without credentials or spend:
+
+    python fake_azure_openai.py --port 8100 --chat-ttft-ms 400 --chat-token-ms 15 --rpm 600
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=fake uvicorn main-wo-neo:app
+
+Embeddings are deterministic: the vector for a text is seeded from its
+sha256, so identical texts always embed identically and repeated runs are
+comparable. Latency follows a simple model (fixed cost plus per-input or
+per-token cost, with multiplicative jitter). Requests-per-minute and
+tokens-per-minute limits answer 429 with retry-after headers, as Azure does.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the policy covers damage to the insured property subject to the deductible and the "
+    "exclusions listed in the schedule claims must be notified within thirty days of the incident "
+    "and the insurer may request supporting documents before settlement"
+).split()
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token, the same estimate the app uses when usage is missing"""
+    return max(1, len(text) // 4)
+
+
+def deterministic_embedding(text: str, dimension: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class RateLimiter:
+    """
+    Sliding one-minute window over requests and tokens
+    
+    Mirrors Azure's per-deployment RPM/TPM quotas: a request that would go
+    over either limit is rejected with the seconds until enough usage ages out.
+    """
+    
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events: List[tuple] = []  # (timestamp, tokens)
+    
+    def acquire(self, tokens: int) -> Optional[float]:
+        """
+        Returns:
+            None if admitted, otherwise seconds to wait before retrying
+        """
+        now = time.monotonic()
+        self._events = [(t, n) for t, n in self._events if now - t < 60]
+        over_requests = self.rpm and len(self._events) >= self.rpm
+        over_tokens = self.tpm and sum(n for _, n in self._events) + tokens > self.tpm
+        if over_requests or over_tokens:
+            return max(0.1, 60 - (now - self._events[0][0])) if self._events else 1.0
+        self._events.append((now, tokens))
+        return None
+
+
+class FakeAzureOpenAI:
+    """Latency, throughput and response model behind the fake routes"""
+    
+    def __init__(
+        self,
+        dimension: int = 1536,
+        embedding_base_ms: float = 50,
+        embedding_per_input_ms: float = 2,
+        chat_ttft_ms: float = 300,
+        chat_token_ms: float = 10,
+        completion_tokens: int = 120,
+        jitter: float = 0.2,
+        max_concurrency: int = 0,
+        rpm: int = 0,
+        tpm: int = 0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            dimension: Embedding dimension (requests may override with `dimensions`)
+            embedding_base_ms: Fixed latency of an embeddings call
+            embedding_per_input_ms: Added latency per input text
+            chat_ttft_ms: Time to the first completion token
+            chat_token_ms: Time per further completion token
+            completion_tokens: Completion length when max_tokens is not given
+            jitter: Latency is scaled by a uniform factor in [1 - jitter, 1 + jitter]
+            max_concurrency: Requests served at once (0 = unlimited); the rest queue
+            rpm / tpm: Requests and tokens per minute before 429s (0 = unlimited)
+            error_rate: Fraction of requests answered with a 500
+            seed: Seed for jitter and injected errors
+        """
+        self.dimension = dimension
+        self.embedding_base_ms = embedding_base_ms
+        self.embedding_per_input_ms = embedding_per_input_ms
+        self.chat_ttft_ms = chat_ttft_ms
+        self.chat_token_ms = chat_token_ms
+        self.completion_tokens = completion_tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rpm, tpm)
+        self._random = random.Random(seed)
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        
+        self.stats: Dict[str, int] = {
+            'embedding_requests': 0,
+            'embedding_inputs': 0,
+            'chat_requests': 0,
+            'completion_tokens': 0,
+            'rate_limited': 0,
+            'injected_errors': 0,
+            'in_flight': 0
+        }
+    
+    def _scaled(self, ms: float) -> float:
+        return ms / 1000 * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def admit(self, tokens: int):
+        """Apply the rate limits and error injection (raises the HTTP error)"""
+        retry_after = self.limiter.acquire(tokens)
+        if retry_after is not None:
+            self.stats['rate_limited'] += 1
+            raise HTTPException(
+                status_code=429,
+                detail={'error': {
+                    'code': '429',
+                    'message': f"Requests to the deployment have exceeded the rate limit. Retry after {retry_after:.0f} seconds."
+                }},
+                headers={'Retry-After': str(max(1, round(retry_after))), 'retry-after-ms': str(int(retry_after * 1000))}
+            )
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats['injected_errors'] += 1
+            raise HTTPException(status_code=500, detail={'error': {'code': 'InternalServerError', 'message': 'Injected failure'}})
+    
+    def _slot(self):
+        """Concurrency slot held for a request's whole service time (streams included)"""
+        return self._semaphore if self._semaphore is not None else contextlib.nullcontext()
+    
+    async def _serve(self, seconds: float):
+        async with self._slot():
+            await asyncio.sleep(seconds)
+    
+    async def embeddings(self, body: Dict, deployment: str) -> Dict:
+        inputs = body.get('input', [])
+        # A string, a list of strings, or pre-tokenized input (token ID lists, as langchain sends)
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        if not inputs or not all(isinstance(item, (str, list)) for item in inputs):
+            raise HTTPException(status_code=400, detail={'error': {'code': 'invalid_request', 'message': "'input' must be a string, a list of strings or a list of token arrays"}})
+        tokens = sum(estimate_tokens(item) if isinstance(item, str) else len(item) for item in inputs)
+        inputs = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+        self.admit(tokens)
+        
+        self.stats['embedding_requests'] += 1
+        self.stats['embedding_inputs'] += len(inputs)
+        await self._serve(self._scaled(self.embedding_base_ms + self.embedding_per_input_ms * len(inputs)))
+        
+        dimension = int(body.get('dimensions') or self.dimension)
+        # The openai SDK asks for base64 (little-endian float32) by default
+        as_base64 = body.get('encoding_format') == 'base64'
+        data = []
+        for i, text in enumerate(inputs):
+            vector = deterministic_embedding(text, dimension)
+            embedding = base64.b64encode(vector.astype('<f4').tobytes()).decode() if as_base64 else vector.tolist()
+            data.append({'object': 'embedding', 'index': i, 'embedding': embedding})
+        return {
+            'object': 'list',
+            'data': data,
+            'model': body.get('model') or deployment,
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        }
+    
+    def _completion_text(self, prompt: str, max_tokens: Optional[int]) -> List[str]:
+        """Deterministic completion for a prompt, as a list of token-sized pieces"""
+        count = min(max_tokens or self.completion_tokens, self.completion_tokens)
+        words = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        return [("" if i == 0 else " ") + words.choice(WORDS) for i in range(count)]
+    
+    async def chat(self, body: Dict, deployment: str):
+        messages = body.get('messages') or []
+        prompt = "\n".join(str(m.get('content', '')) for m in messages)
+        prompt_tokens = estimate_tokens(prompt)
+        pieces = self._completion_text(prompt, body.get('max_tokens'))
+        self.admit(prompt_tokens + len(pieces))
+        
+        self.stats['chat_requests'] += 1
+        self.stats['completion_tokens'] += len(pieces)
+        model = body.get('model') or deployment
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(pieces),
+            'total_tokens': prompt_tokens + len(pieces)
+        }
+        
+        if not body.get('stream'):
+            await self._serve(self._scaled(self.chat_ttft_ms + self.chat_token_ms * (len(pieces) - 1)))
+            return {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': "".join(pieces)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            }
+        
+        include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+        
+        async def events():
+            def chunk(delta: Dict, finish_reason: Optional[str] = None, **extra) -> str:
+                payload = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                    **extra
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+            
+            async with self._slot():
+                await asyncio.sleep(self._scaled(self.chat_ttft_ms))
+                yield chunk({'role': 'assistant', 'content': ''})
+                for i, piece in enumerate(pieces):
+                    if i:
+                        await asyncio.sleep(self._scaled(self.chat_token_ms))
+                    yield chunk({'content': piece})
+            yield chunk({}, 'stop')
+            if include_usage:
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(fake: FakeAzureOpenAI) -> FastAPI:
+    """Azure routes (/openai/deployments/{deployment}/...) plus the plain OpenAI /v1 routes"""
+    app = FastAPI(title="Fake Azure OpenAI")
+    
+    @app.middleware("http")
+    async def count_in_flight(request: Request, call_next):
+        fake.stats['in_flight'] += 1
+        try:
+            return await call_next(request)
+        finally:
+            fake.stats['in_flight'] -= 1
+    
+    @app.exception_handler(HTTPException)
+    async def openai_error(request: Request, exc: HTTPException):
+        # OpenAI clients expect the error object at the top level, not under "detail"
+        return JSONResponse(exc.detail, status_code=exc.status_code, headers=exc.headers)
+    
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    async def azure_embeddings(deployment: str, request: Request):
+        return await fake.embeddings(await request.json(), deployment)
+    
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def azure_chat(deployment: str, request: Request):
+        return await fake.chat(await request.json(), deployment)
+    
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        return await fake.embeddings(body, body.get('model', 'text-embedding-3-small'))
+    
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        return await fake.chat(body, body.get('model', 'gpt-4.1-mini'))
+    
+    @app.get("/stats")
+    async def stats():
+        return fake.stats
+    
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--embedding-base-ms", type=float, default=50)
+    parser.add_argument("--embedding-per-input-ms", type=float, default=2)
+    parser.add_argument("--chat-ttft-ms", type=float, default=300)
+    parser.add_argument("--chat-token-ms", type=float, default=10)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests served at once (0 = unlimited)")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429 (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per minute before 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    import uvicorn
+    fake = FakeAzureOpenAI(
+        dimension=args.dimension,
+        embedding_base_ms=args.embedding_base_ms,
+        embedding_per_input_ms=args.embedding_per_input_ms,
+        chat_ttft_ms=args.chat_ttft_ms,
+        chat_token_ms=args.chat_token_ms,
+        completion_tokens=args.completion_tokens,
+        jitter=args.jitter,
+        max_concurrency=args.max_concurrency,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
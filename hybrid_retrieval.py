@@ -0,0 +1,145 @@
+"""
+Hybrid Retrieval - Concurrent FTS5 (BM25) and FAISS Search Fused with RRF
+"""
+import asyncio
+import logging
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from app.core.instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+
+class HybridRetriever:
+    """
+    Lexical + dense retrieval with reciprocal rank fusion
+    
+    Exact identifiers (policy numbers, clause numbers, amounts) are matched by
+    the chunk full-text index; paraphrases by the vector index. Each side
+    returns top_k * candidate_multiplier candidates and RRF picks the top_k.
+    """
+    
+    def __init__(self, vector_store, db_manager, rrf_k: int = 60, candidate_multiplier: int = 2):
+        """
+        Initialize hybrid retriever
+        
+        Args:
+            vector_store: Vector store (search_batch, get_chunks, get_result_embeddings)
+            db_manager: DatabaseManager providing search_chunks_fts
+            rrf_k: RRF rank constant (higher flattens the rank weighting)
+            candidate_multiplier: Candidates per side relative to top_k
+        """
+        self.vector_store = vector_store
+        self.db_manager = db_manager
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+    
+    def lexical_search(self, query: str, limit: int, document_ids: Optional[List[str]] = None) -> List[Dict]:
+        """BM25 search, materialized as vector-store result dicts in rank order"""
+        with stage('lexical_search'):
+            try:
+                hits = self.db_manager.search_chunks_fts(query, limit=limit, document_ids=document_ids)
+            except Exception as e:
+                logger.warning(f"Lexical search failed, using vector results only: {e}")
+                return []
+            return self.vector_store.get_chunks([hit['chunk_id'] for hit in hits])
+    
+    def vector_search(self, query_embeddings: np.ndarray, limit: int, document_ids_per_query, **search_options) -> List[List[Dict]]:
+        """Vectorized FAISS search, one result list per query"""
+        with stage('vector_search'):
+            return self.vector_store.search_batch(
+                query_embeddings, top_k=limit, document_ids_per_query=document_ids_per_query, **search_options
+            )
+    
+    def fuse(
+        self,
+        vector_results: List[Dict],
+        lexical_results: List[Dict],
+        query_embedding: np.ndarray,
+        top_k: int
+    ) -> List[Dict]:
+        """
+        Reciprocal rank fusion of both rankings
+        
+        'score' stays the cosine similarity to the query (computed for
+        lexical-only hits) so downstream MMR and evidence scores keep one
+        scale; 'rrf_score' and 'match' describe the fusion.
+        """
+        fused: Dict[str, Dict] = {}
+        for source, results in (('vector', vector_results), ('lexical', lexical_results)):
+            for rank, result in enumerate(results):
+                entry = fused.get(result['id'])
+                if entry is None:
+                    entry = fused[result['id']] = {**result, 'rrf_score': 0.0, 'match': source}
+                elif entry['match'] != source:
+                    entry['match'] = 'both'
+                entry['rrf_score'] += 1.0 / (self.rrf_k + rank + 1)
+        
+        ranked = sorted(fused.values(), key=lambda r: -r['rrf_score'])[:top_k]
+        
+        lexical_only = [r for r in ranked if 'score' not in r]
+        if lexical_only:
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            embeddings = self.vector_store.get_result_embeddings(lexical_only)
+            for result, embedding in zip(lexical_only, embeddings):
+                result['score'] = float(embedding @ query)
+        return ranked
+    
+    async def search(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        document_ids: Optional[List[str]] = None,
+        **search_options
+    ) -> List[Dict]:
+        """Run lexical and vector retrieval concurrently and fuse them"""
+        candidates = top_k * self.candidate_multiplier
+        vector_results, lexical_results = await asyncio.gather(
+            asyncio.to_thread(
+                self.vector_search, np.asarray(query_embedding).reshape(1, -1),
+                candidates, [document_ids], **search_options
+            ),
+            asyncio.to_thread(self.lexical_search, query, candidates, document_ids)
+        )
+        return self.fuse(vector_results[0], lexical_results, query_embedding, top_k)
+    
+    async def search_batch(
+        self,
+        queries: List[str],
+        query_embeddings: np.ndarray,
+        top_k: int = 10,
+        document_ids_per_query: Optional[List[Optional[List[str]]]] = None,
+        **search_options
+    ) -> List[List[Dict]]:
+        """Batched variant: one vectorized FAISS search alongside per-query lexical searches"""
+        candidates = top_k * self.candidate_multiplier
+        document_ids_per_query = document_ids_per_query or [None] * len(queries)
+        vector_results, *lexical_results = await asyncio.gather(
+            asyncio.to_thread(
+                self.vector_search, query_embeddings, candidates, document_ids_per_query, **search_options
+            ),
+            *[
+                asyncio.to_thread(self.lexical_search, query, candidates, document_ids)
+                for query, document_ids in zip(queries, document_ids_per_query)
+            ]
+        )
+        query_embeddings = np.asarray(query_embeddings).reshape(len(queries), -1)
+        return [
+            self.fuse(vector, lexical, embedding, top_k)
+            for vector, lexical, embedding in zip(vector_results, lexical_results, query_embeddings)
+        ]
+
+
+# Singleton instance
+hybrid_retriever = None
+
+def get_hybrid_retriever(vector_store, db_manager, **options) -> HybridRetriever:
+    """Get or create hybrid retriever instance"""
+    global hybrid_retriever
+    if hybrid_retriever is None:
+        hybrid_retriever = HybridRetriever(vector_store, db_manager, **options)
+    return hybrid_retriever
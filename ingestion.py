@@ -0,0 +1,389 @@
+"""
+Document Ingestion Pipeline - Durable Queue with Off-Event-Loop Workers
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Tuple
+
+from app.core.document_processor import get_document_processor
+from app.core.instrumentation import get_metrics_registry, observe_stage, stage, track_stages
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when accepting more jobs would exceed max_in_flight"""
+
+
+class PermanentIngestError(Exception):
+    """A failure that fails the same way on every attempt (missing, unparseable or empty document)"""
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """
+    Whether retrying a failed job is pointless
+    
+    Bad input (validation errors, 4xx answers from the embedding API other
+    than timeouts and rate limits) is permanent; everything else, such as
+    network errors, 5xx answers or a locked database, is retried.
+    """
+    if isinstance(error, (PermanentIngestError, ValueError, TypeError, KeyError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 409, 429)
+
+
+def extract_and_chunk(file_path: str, file_type: str, filename: str, document_type: str) -> Tuple[List[Dict], Dict[str, float]]:
+    """
+    Extract text and build contextual chunks (CPU-bound; runs in a worker process)
+    
+    Returns:
+        (chunk dicts from create_contextual_chunks, each with its detected
+        section; seconds spent in the extract and chunk stages)
+    
+    Raises:
+        PermanentIngestError: If the file cannot be parsed
+    """
+    processor = get_document_processor()
+    started = time.perf_counter()
+    try:
+        text = processor.extract_text(file_path, file_type)
+    except OSError:
+        raise
+    except Exception as e:
+        # Parsing is deterministic: a file that fails to parse fails every time
+        raise PermanentIngestError(f"Could not extract text: {e}") from e
+    timings = {'extract': time.perf_counter() - started}
+    if not text.strip():
+        return [], timings
+    
+    started = time.perf_counter()
+    chunks = processor.create_contextual_chunks(
+        text,
+        {'filename': filename, 'document_type': document_type}
+    )
+    for i, chunk in enumerate(chunks):
+        chunk['section'] = processor._detect_section(chunk['text'], i)
+    timings['chunk'] = time.perf_counter() - started
+    return chunks, timings
+
+
+class IngestionPipeline:
+    """Runs document ingestion on worker pools so the event loop stays free"""
+    
+    def __init__(
+        self,
+        db_manager,
+        vector_store,
+        embeddings_service,
+        process_workers: int = 2,
+        thread_workers: int = 4,
+        workers: int = 2,
+        max_in_flight: int = 1000,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 1800,
+        on_indexed: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Initialize ingestion pipeline
+        
+        Args:
+            db_manager: DatabaseManager for documents and chunks
+            vector_store: Vector store receiving the embeddings
+            embeddings_service: Service providing embed_texts
+            process_workers: Processes for text extraction and chunking
+            thread_workers: Threads for embedding calls, FAISS and SQLite writes
+            workers: Jobs processed concurrently by this app process
+            max_in_flight: Queued plus running jobs accepted before submit refuses
+            max_attempts: Attempts per job before it is marked failed (permanent
+                failures, see is_permanent_failure, are not retried)
+            retry_backoff: Base delay in seconds before a retry (doubles per attempt)
+            poll_interval: Seconds between queue polls when idle
+            lease_seconds: Heartbeat age after which a running job is reclaimed
+            on_indexed: Called with the document ID once its new chunks are stored
+        """
+        self.db_manager = db_manager
+        self.vector_store = vector_store
+        self.embeddings_service = embeddings_service
+        
+        # Spawned workers only import this module, not the web app
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=process_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self.thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="ingest")
+        self._jobs_counter = get_metrics_registry().counter(
+            "truecontext_ingest_jobs_total", "Finished ingest job attempts by outcome", ("outcome",)
+        )
+        
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.on_indexed = on_indexed
+        
+        self._worker_tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    async def _in_thread(self, func, *args):
+        # Carry the caller's context along, as asyncio.to_thread does, so stage timings land in its breakdown
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.thread_pool, functools.partial(context.run, func, *args)
+        )
+    
+    def start(self):
+        """Start queue workers on the running event loop"""
+        if self._worker_tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(n), name=f"ingest-worker-{n}")
+            for n in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} ingest workers")
+    
+    async def submit(self, document_id: str) -> Dict:
+        """Queue a document for processing and return its job"""
+        return (await self.submit_many([document_id]))[0]
+    
+    async def submit_many(self, document_ids: List[str]) -> List[Dict]:
+        """
+        Queue documents for processing
+        
+        Raises:
+            QueueFullError: If the jobs would push the queue past max_in_flight
+                (checked atomically with the insert; none are queued then)
+        """
+        now = datetime.utcnow()
+        jobs = await self._in_thread(self.db_manager.create_ingest_jobs, [
+            {
+                'id': f"job-{uuid.uuid4().hex[:12]}",
+                'document_id': document_id,
+                'status': 'queued',
+                'max_attempts': self.max_attempts,
+                'created_at': now,
+                'available_at': now,
+                'updated_at': now
+            }
+            for document_id in document_ids
+        ], self.max_in_flight)
+        if jobs is None:
+            raise QueueFullError(
+                f"Ingest queue full ({len(document_ids)} jobs do not fit under the limit of {self.max_in_flight})"
+            )
+        if self._wakeup:
+            self._wakeup.set()
+        return [job_to_dict(job) for job in jobs]
+    
+    async def check_capacity(self, count: int):
+        """
+        Raise QueueFullError unless count more jobs fit under max_in_flight
+        
+        Advisory early rejection (e.g. before saving uploads); submit_many
+        enforces the limit atomically.
+        """
+        counts = await self._in_thread(self.db_manager.count_ingest_jobs)
+        in_flight = counts.get('queued', 0) + counts.get('running', 0)
+        if in_flight + count > self.max_in_flight:
+            raise QueueFullError(
+                f"Ingest queue full ({in_flight} in flight, limit {self.max_in_flight})"
+            )
+    
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        job = await self._in_thread(self.db_manager.get_ingest_job, job_id)
+        return job_to_dict(job) if job else None
+    
+    async def latest_job_for(self, document_id: str) -> Optional[Dict]:
+        """Most recent job submitted for a document"""
+        job = await self._in_thread(self.db_manager.get_latest_ingest_job, document_id)
+        return job_to_dict(job) if job else None
+    
+    async def get_stats(self) -> Dict:
+        counts = await self._in_thread(self.db_manager.count_ingest_jobs)
+        return {
+            'workers': len(self._worker_tasks),
+            'max_in_flight': self.max_in_flight,
+            'jobs': counts
+        }
+    
+    async def _worker(self, n: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = await self._in_thread(self.db_manager.claim_ingest_job, self.lease_seconds)
+            except Exception:
+                logger.exception("Failed to claim ingest job")
+                job = None
+            
+            if job is None:
+                # Idle: wait for a local submit, or poll for jobs queued by other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._run_job(job)
+    
+    async def _run_job(self, job):
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            chunks_created = await self.process_document(job.document_id)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending an attempt
+            self.db_manager.update_ingest_job(
+                job.id, status='queued', attempts=job.attempts - 1, available_at=datetime.utcnow()
+            )
+            raise
+        except Exception as e:
+            retry = not is_permanent_failure(e)
+            logger.exception(
+                f"Ingestion failed for {job.document_id} (attempt {job.attempts}"
+                f"{'' if retry else ', permanent failure, not retrying'})"
+            )
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            failed = await self._in_thread(self.db_manager.fail_ingest_job, job.id, str(e), delay, retry)
+            self._jobs_counter.inc(outcome='failed' if failed is not None and failed.status == 'failed' else 'retried')
+        else:
+            await self._in_thread(self.db_manager.complete_ingest_job, job.id, chunks_created)
+            self._jobs_counter.inc(outcome='done')
+        finally:
+            heartbeat.cancel()
+    
+    async def _heartbeat(self, job_id: str):
+        """Keep the job's lease fresh while it runs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._in_thread(self.db_manager.heartbeat_ingest_job, job_id)
+    
+    async def process_document(self, document_id: str) -> int:
+        """
+        Process a document end to end (vector-only, no graph)
+        
+        Returns:
+            Number of chunks created
+        """
+        stages = track_stages()
+        doc = await self._in_thread(self.db_manager.get_document, document_id)
+        if not doc:
+            raise PermanentIngestError(f"Document {document_id} not found")
+        
+        await self._in_thread(self.db_manager.update_document_status, document_id, "processing")
+        try:
+            # Extract text and create chunks (CPU-bound)
+            chunks, timings = await asyncio.get_running_loop().run_in_executor(
+                self.process_pool, extract_and_chunk,
+                doc.file_path, doc.file_type, doc.filename, doc.document_type
+            )
+            for name, seconds in timings.items():
+                observe_stage(name, seconds)
+            if not chunks:
+                raise PermanentIngestError("No text extracted")
+            
+            # Generate embeddings (network I/O)
+            chunk_texts = [c['enriched_text'] for c in chunks]
+            with stage('embed_texts'):
+                embeddings = await self._in_thread(self.embeddings_service.embed_texts, chunk_texts)
+            
+            # Store in FAISS and SQLite
+            await self._in_thread(self._store_chunks, doc, chunks, embeddings)
+        except Exception:
+            await self._in_thread(self.db_manager.update_document_status, document_id, "error")
+            raise
+        
+        await self._in_thread(self.db_manager.update_document_status, document_id, "indexed", True)
+        if self.on_indexed:
+            self.on_indexed(document_id)
+        logger.info(
+            f"Indexed {document_id}: {len(chunks)} chunks "
+            f"({', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in stages.items())})"
+        )
+        return len(chunks)
+    
+    def _store_chunks(self, doc, chunks: List[Dict], embeddings):
+        """Write chunk embeddings and rows (runs in the thread pool)"""
+        document_id = doc.id
+        
+        # Drop vectors from any previous processing run first
+        self.vector_store.delete_by_document_id(document_id)
+        chunk_metadata = [
+            {
+                'id': f"chunk-{document_id}-{i}",
+                'document_id': document_id,
+                'document_type': doc.document_type,
+                'chunk_index': c['chunk_index'],
+                'text': c['text'],
+                'tokens': c['tokens']
+            }
+            for i, c in enumerate(chunks)
+        ]
+        with stage('faiss_add'):
+            self.vector_store.add_embeddings(embeddings, chunk_metadata)
+        
+        chunk_data = [
+            {
+                'id': f"chunk-{document_id}-{i}",
+                'document_id': document_id,
+                'chunk_index': c['chunk_index'],
+                'text': c['text'],
+                'enriched_text': c['enriched_text'],
+                'tokens': c['tokens'],
+                'embedding_id': f"chunk-{document_id}-{i}",
+                'quality_score': 0.5,
+                'section': c['section']
+            }
+            for i, c in enumerate(chunks)
+        ]
+        # Old rows go and new rows arrive in one transaction
+        with stage('sqlite_write'), self.db_manager.session_scope():
+            self.db_manager.delete_chunks_by_document(document_id)
+            self.db_manager.create_chunks(chunk_data)
+    
+    async def shutdown(self):
+        """Stop queue workers (requeueing their jobs) and worker pools"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def job_to_dict(job) -> Dict:
+    """Serialize an IngestJob row for API responses"""
+    return {
+        'job_id': job.id,
+        'document_id': job.document_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'chunks_created': job.chunks_created,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+# Singleton instance
+ingestion_pipeline = None
+
+def get_ingestion_pipeline(db_manager, vector_store, embeddings_service, **options) -> IngestionPipeline:
+    """Get or create ingestion pipeline instance"""
+    global ingestion_pipeline
+    if ingestion_pipeline is None:
+        ingestion_pipeline = IngestionPipeline(db_manager, vector_store, embeddings_service, **options)
+    return ingestion_pipeline
@@ -0,0 +1,340 @@
+"""
+Load Test - Drive main-wo-neo.py with Upload/Process/Query Mixes at a Target RPS
+
+Typically run against the app pointed at fake_azure_openai.py:
+    
+    python fake_azure_openai.py --port 8100 &
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=fake uvicorn main-wo-neo:app --port 8000 &
+    python loadtest.py --rps 20 --duration 120 --mix standard=50,truecontext=20,compare=10,stream=10,ingest=10
+
+A setup phase uploads and indexes --documents synthetic documents. The load
+phase is open-loop: operations start on schedule whether or not earlier ones
+have finished, so a slow server shows up as latency and errors instead of
+silently lowering the offered load. Starts beyond --max-in-flight are
+counted as dropped. Results per endpoint (throughput, p50-p99 latency and
+errors by status) are printed and written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+OPERATIONS = ("standard", "truecontext", "compare", "stream", "ingest")
+DOCUMENT_TYPES = ("policy", "claims", "contract", "general")
+SENTENCES = (
+    "Policy {ident} covers accidental damage to the insured property up to the stated limit.",
+    "The deductible under policy {ident} is {amount} per claim.",
+    "Claims under {ident} must be notified within 30 days of the incident.",
+    "Flood and earthquake damage are excluded unless endorsement {ident}-E applies.",
+    "The insurer will settle approved claims within 15 business days.",
+    "Premiums for {ident} are payable monthly and renew automatically.",
+    "Either party may terminate the agreement with 60 days written notice.",
+    "Liability is limited to {amount} for any single occurrence."
+)
+QUESTIONS = (
+    "What is the deductible for policy {ident}?",
+    "Is flood damage covered under {ident}?",
+    "How long do I have to report a claim on {ident}?",
+    "What is the liability limit?",
+    "When are premiums due for {ident}?",
+    "How can the agreement be terminated?"
+)
+
+
+class EndpointStats:
+    """Latency samples and outcome counts for one endpoint"""
+    
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.first_byte: List[float] = []
+        self.statuses: Dict[str, int] = {}
+    
+    def record(self, status: str, seconds: float, first_byte: Optional[float] = None):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status.startswith("2"):
+            self.latencies.append(seconds)
+            if first_byte is not None:
+                self.first_byte.append(first_byte)
+    
+    def summary(self, duration: float) -> Dict:
+        total = sum(self.statuses.values())
+        ok = sum(count for status, count in self.statuses.items() if status.startswith("2"))
+        result = {
+            'requests': total,
+            'ok': ok,
+            'error_rate': round(1 - ok / total, 4) if total else 0.0,
+            'throughput_rps': round(ok / duration, 3) if duration else 0.0,
+            'statuses': dict(sorted(self.statuses.items()))
+        }
+        for name, samples in (('latency', self.latencies), ('first_byte', self.first_byte)):
+            if samples:
+                values = np.asarray(samples) * 1000
+                result[f'{name}_ms'] = {
+                    f'p{q}': round(float(np.percentile(values, q)), 1) for q in (50, 90, 95, 99)
+                }
+                result[f'{name}_ms']['max'] = round(float(values.max()), 1)
+        return result
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.stats: Dict[str, EndpointStats] = {}
+        self.document_ids: List[str] = []
+        self.identifiers: Dict[str, str] = {}  # document ID -> policy number in its text
+        self.next_document = 0
+        self.in_flight = 0
+        self.dropped = 0
+        self._background: set = set()
+    
+    def _stats(self, name: str) -> EndpointStats:
+        return self.stats.setdefault(name, EndpointStats())
+    
+    async def call(self, name: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        """Send a request and record it under `name`; network errors are recorded as their type"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self._stats(name).record(type(e).__name__, time.perf_counter() - started)
+            return None
+        self._stats(name).record(str(response.status_code), time.perf_counter() - started)
+        return response
+    
+    def synthetic_document(self) -> tuple:
+        number = self.next_document
+        self.next_document += 1
+        ident = f"POL-{self.args.seed:02d}{number:06d}"
+        sentences = [
+            self.random.choice(SENTENCES).format(ident=ident, amount=f"${self.random.randrange(250, 50000, 250):,}")
+            for _ in range(self.args.document_sentences)
+        ]
+        return ident, f"loadtest-{ident}.txt", "\n".join(sentences).encode()
+    
+    async def ingest(self, wait: bool) -> Optional[str]:
+        """Upload and process one document; with wait, poll until indexed"""
+        ident, filename, content = self.synthetic_document()
+        document_type = self.random.choice(DOCUMENT_TYPES)
+        response = await self.call(
+            "POST /documents/upload", "POST", "/documents/upload",
+            files={'file': (filename, content, 'text/plain')}, data={'document_type': document_type}
+        )
+        if response is None or response.status_code != 200:
+            return None
+        document_id = response.json()['document_id']
+        started = time.perf_counter()
+        response = await self.call("POST /documents/process", "POST", f"/documents/process/{document_id}")
+        if response is None or response.status_code != 200:
+            return None
+        
+        async def until_indexed():
+            deadline = started + self.args.ingest_timeout
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(self.args.poll_interval)
+                try:
+                    status = (await self.client.get(f"/documents/{document_id}/status")).json().get('status')
+                except (httpx.HTTPError, ValueError):
+                    continue
+                if status == 'indexed':
+                    self._stats("ingest: process -> indexed").record("200", time.perf_counter() - started)
+                    self.document_ids.append(document_id)
+                    self.identifiers[document_id] = ident
+                    return document_id
+                if status == 'error':
+                    break
+            self._stats("ingest: process -> indexed").record("error" if time.perf_counter() < deadline else "timeout", 0.0)
+            return None
+        
+        if wait:
+            return await until_indexed()
+        # Indexing time is tracked in the background; the operation itself ends at process
+        task = asyncio.create_task(until_indexed())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return document_id
+    
+    def query_payload(self) -> Dict:
+        documents = self.random.sample(self.document_ids, min(len(self.document_ids), self.random.randint(1, 3)))
+        ident = self.identifiers[documents[0]]
+        return {
+            'query': self.random.choice(QUESTIONS).format(ident=ident),
+            'document_ids': documents,
+            'model': self.args.model,
+            'top_k': self.args.top_k
+        }
+    
+    async def stream(self):
+        """Streamed query: first byte is the evidence event, latency runs to the done event"""
+        name = "POST /rag/standard/stream"
+        started = time.perf_counter()
+        first_byte = None
+        try:
+            async with self.client.stream("POST", "/rag/standard/stream", json=self.query_payload()) as response:
+                status = str(response.status_code)
+                async for chunk in response.aiter_bytes():
+                    if first_byte is None and chunk:
+                        first_byte = time.perf_counter() - started
+                    if b"event: error" in chunk:
+                        status = "stream_error"
+        except httpx.HTTPError as e:
+            self._stats(name).record(type(e).__name__, time.perf_counter() - started)
+            return
+        self._stats(name).record(status, time.perf_counter() - started, first_byte)
+    
+    async def operation(self, kind: str):
+        self.in_flight += 1
+        try:
+            if kind == "ingest":
+                await self.ingest(wait=False)
+            elif kind == "stream":
+                await self.stream()
+            else:
+                path = {'standard': "/rag/standard", 'truecontext': "/rag/truecontext", 'compare': "/rag/compare"}[kind]
+                await self.call(f"POST {path}", "POST", path, json=self.query_payload())
+        finally:
+            self.in_flight -= 1
+    
+    async def wait_until_ready(self):
+        """Poll /health/ready so index loading at startup is not counted as errors"""
+        deadline = time.perf_counter() + self.args.ready_timeout
+        while True:
+            try:
+                response = await self.client.get("/health/ready")
+                if response.status_code == 200:
+                    print(f"Setup: app ready ({response.json().get('startup_seconds')})", flush=True)
+                    return
+                detail = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                detail = str(e)
+            if time.perf_counter() > deadline:
+                raise SystemExit(f"Setup failed: app not ready after {self.args.ready_timeout}s ({detail})")
+            await asyncio.sleep(self.args.poll_interval)
+    
+    async def setup(self):
+        await self.wait_until_ready()
+        print(f"Setup: uploading and indexing {self.args.documents} documents...", flush=True)
+        results = await asyncio.gather(*[self.ingest(wait=True) for _ in range(self.args.documents)])
+        if not any(results):
+            raise SystemExit("Setup failed: no document was indexed (is the app running and pointed at the fake server?)")
+        print(f"Setup: {sum(1 for r in results if r)} documents indexed", flush=True)
+        # Setup traffic is not part of the measured load
+        self.stats.clear()
+    
+    async def run(self, mix: Dict[str, float]) -> float:
+        kinds, weights = list(mix), list(mix.values())
+        total = int(self.args.rps * self.args.duration)
+        tasks = []
+        print(f"Load: {self.args.rps} rps for {self.args.duration}s ({total} operations)", flush=True)
+        started = time.perf_counter()
+        scheduled = started
+        for _ in range(total):
+            if self.args.arrival == "poisson":
+                scheduled += self.random.expovariate(self.args.rps)
+            else:
+                scheduled += 1 / self.args.rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.in_flight >= self.args.max_in_flight:
+                self.dropped += 1
+                continue
+            tasks.append(asyncio.create_task(self.operation(self.random.choices(kinds, weights)[0])))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        if self._background:
+            await asyncio.gather(*list(self._background))
+        return elapsed
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{kind}', expected {', '.join(OPERATIONS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, args)
+        await test.setup()
+        elapsed = await test.run(args.mix)
+        
+        snapshots = {}
+        for path in ("/health", "/ingest/stats"):
+            try:
+                snapshots[path] = (await client.get(path)).json()
+            except (httpx.HTTPError, ValueError) as e:
+                snapshots[path] = {'error': str(e)}
+    
+    report = {
+        'started_at': args.started_at,
+        'config': {k: v for k, v in vars(args).items() if k != 'started_at'},
+        'elapsed_seconds': round(elapsed, 2),
+        'offered_rps': args.rps,
+        'dropped': test.dropped,
+        'endpoints': {name: stats.summary(elapsed) for name, stats in sorted(test.stats.items())},
+        'server': snapshots
+    }
+    
+    print(f"\n{'endpoint':<34}{'reqs':>7}{'ok rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, summary in report['endpoints'].items():
+        latency = summary.get('latency_ms', {})
+        print(
+            f"{name:<34}{summary['requests']:>7}{summary['throughput_rps']:>9.2f}{summary['error_rate'] * 100:>7.1f}"
+            + "".join(f"{latency.get(key, float('nan')):>9.1f}" for key in ('p50', 'p95', 'p99', 'max'))
+        )
+        errors = {status: count for status, count in summary['statuses'].items() if not status.startswith("2")}
+        if errors:
+            print(f"{'':<34}errors: {errors}")
+    if test.dropped:
+        print(f"\n{test.dropped} operations dropped at --max-in-flight {args.max_in_flight}")
+    
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=5, help="operations started per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("standard=50,truecontext=20,compare=10,stream=10,ingest=10"),
+                        help="operation weights, e.g. standard=60,compare=20,ingest=20")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--documents", type=int, default=5, help="documents indexed before the load phase")
+    parser.add_argument("--document-sentences", type=int, default=80)
+    parser.add_argument("--model", default="gpt-4.1-mini")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--ingest-timeout", type=float, default=300, help="seconds to wait for a document to be indexed")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="seconds to wait for /health/ready before setup")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="result file (default: loadtest_results/<timestamp>.json)")
+    args = parser.parse_args()
+    
+    started_at = datetime.utcnow()
+    args.started_at = started_at.isoformat()
+    args.output = args.output or os.path.join("loadtest_results", f"{started_at:%Y%m%dT%H%M%S}.json")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Write-Behind Log Writer - Buffered Bulk Inserts for Query/Chat/Comparison Logs
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from app.database.sqlite_db import QueryLog, ChatHistory, ComparisonResult
+from app.core.instrumentation import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class LogWriter:
+    """
+    Buffers log rows in memory and writes them in bulk from a background task
+    
+    A flush runs every flush_interval_ms, or as soon as max_batch rows are
+    waiting, and always on shutdown. Request handlers only append to the
+    buffer, so no commit or fsync sits on the response path. Rows are
+    timestamped when they are enqueued, not when they are written.
+    """
+    
+    MODELS = {
+        'query_log': QueryLog,
+        'chat_history': ChatHistory,
+        'comparison': ComparisonResult
+    }
+    
+    def __init__(self, db_manager, max_batch: int = 200, flush_interval_ms: int = 250):
+        """
+        Initialize log writer
+        
+        Args:
+            db_manager: DatabaseManager providing bulk_insert
+            max_batch: Buffered rows that trigger an immediate flush
+            flush_interval_ms: Longest time a row waits in the buffer
+        """
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.rows_enqueued = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+    
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="log-writer")
+    
+    async def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+    
+    def enqueue(self, kind: str, row: Dict):
+        """
+        Buffer a row for a later bulk insert
+        
+        Args:
+            kind: 'query_log', 'chat_history' or 'comparison'
+            row: Column values; id and timestamp are filled in when missing
+        """
+        if kind not in self.MODELS:
+            raise ValueError(f"Unknown log kind '{kind}'")
+        row.setdefault('id', f"log-{uuid.uuid4().hex[:12]}")
+        row.setdefault('timestamp', datetime.utcnow())
+        
+        with self._lock:
+            self._buffer.append((kind, row))
+            self.rows_enqueued += 1
+            depth = len(self._buffer)
+        
+        if depth >= self.max_batch and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def log_query(self, row: Dict):
+        self.enqueue('query_log', row)
+    
+    def log_chat_message(self, row: Dict):
+        self.enqueue('chat_history', row)
+    
+    def log_comparison(self, row: Dict):
+        self.enqueue('comparison', row)
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._buffer:
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    logger.exception("Log flush failed")
+    
+    def flush(self):
+        """Write all buffered rows: one bulk insert per table, in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                pending = list(self._buffer)
+                self._buffer.clear()
+            
+            by_kind: Dict[str, List[Dict]] = {}
+            for kind, row in pending:
+                by_kind.setdefault(kind, []).append(row)
+            
+            start = time.perf_counter()
+            try:
+                with self.db_manager.session_scope():
+                    for kind, rows in by_kind.items():
+                        self.db_manager.bulk_insert(self.MODELS[kind], rows)
+                self.rows_written += len(pending)
+            except Exception:
+                logger.exception(f"Bulk log insert of {len(pending)} rows failed; retrying row by row")
+                self._write_individually(by_kind)
+            
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+            observe_stage('log_flush', elapsed_ms / 1000)
+    
+    def _write_individually(self, by_kind: Dict[str, List[Dict]]):
+        """Isolate bad rows so one of them cannot drop a whole batch"""
+        for kind, rows in by_kind.items():
+            for row in rows:
+                try:
+                    self.db_manager.bulk_insert(self.MODELS[kind], [row])
+                    self.rows_written += 1
+                except Exception:
+                    logger.exception(f"Dropping unwritable {kind} row {row.get('id')}")
+                    self.rows_failed += 1
+    
+    def get_stats(self) -> Dict:
+        return {
+            'queue_depth': len(self._buffer),
+            'rows_enqueued': self.rows_enqueued,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0
+        }
+
+
+# Singleton instance
+log_writer = None
+
+def get_log_writer(db_manager, **options) -> LogWriter:
+    """Get or create log writer instance"""
+    global log_writer
+    if log_writer is None:
+        log_writer = LogWriter(db_manager, **options)
+    return log_writer
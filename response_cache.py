@@ -0,0 +1,220 @@
+"""
+Semantic Response Cache - Reuse RAG Answers for Near-Identical Questions
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, FrozenSet, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PartitionKey = Tuple[FrozenSet[str], str, int]
+
+
+class ResponseCache:
+    """
+    Caches RAG responses by query-embedding similarity
+    
+    Entries are partitioned by (document_ids, model, top_k); each partition
+    has its own small exact inner-product index, so a lookup only compares
+    against questions asked of the same documents with the same settings.
+    Entries expire after ttl_seconds and the least recently used are evicted
+    past max_entries. Entries also carry the document version they were
+    computed against (see FAISSVectorStore.document_version); lookups with a
+    different version skip them, so changes made by other processes sharing
+    the store invalidate this cache too.
+    """
+    
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 10000
+    ):
+        """
+        Initialize response cache
+        
+        Args:
+            dimension: Query embedding dimension; must match the embedder
+                (main passes the vector store's dimension)
+            threshold: Minimum cosine similarity for a hit
+            ttl_seconds: Entry lifetime
+            max_entries: Entries kept across all partitions
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        
+        self._lock = threading.Lock()
+        self.partitions: Dict[PartitionKey, faiss.IndexIDMap2] = {}
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()  # LRU order
+        self.next_id = 0
+        # Bumped on every invalidation; results computed across one are not stored
+        self.generation = 0
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def partition_key(document_ids: List[str], model: str, top_k: int) -> PartitionKey:
+        return frozenset(document_ids or ()), model, top_k
+    
+    def _normalize(self, query_embedding: np.ndarray) -> np.ndarray:
+        query = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(query)
+        return query
+    
+    def lookup(
+        self,
+        query_embedding: np.ndarray,
+        document_ids: List[str],
+        model: str,
+        top_k: int,
+        version: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Find a cached response for a similar query
+        
+        Args:
+            version: Current version of the documents; entries stored under
+                another version are stale and dropped
+        
+        Returns:
+            Dict with the cached 'result', the original 'query' and the
+            'similarity', or None on a miss
+        """
+        key = self.partition_key(document_ids, model, top_k)
+        query = self._normalize(query_embedding)
+        now = time.time()
+        
+        with self._lock:
+            index = self.partitions.get(key)
+            while index is not None and index.ntotal > 0:
+                scores, ids = index.search(query, 1)
+                score, entry_id = float(scores[0][0]), int(ids[0][0])
+                if entry_id < 0 or score < self.threshold:
+                    break
+                
+                entry = self.entries[entry_id]
+                if now - entry['created_at'] > self.ttl_seconds or (
+                        version is not None and entry['version'] != version):
+                    self._remove(entry_id)
+                    index = self.partitions.get(key)
+                    continue
+                
+                self.entries.move_to_end(entry_id)
+                self.hits += 1
+                return {'result': entry['result'], 'query': entry['query'], 'similarity': score}
+            
+            self.misses += 1
+            return None
+    
+    def store(
+        self,
+        query_embedding: np.ndarray,
+        document_ids: List[str],
+        model: str,
+        top_k: int,
+        query: str,
+        result: Dict,
+        generation: Optional[int] = None,
+        version: Optional[int] = None
+    ):
+        """
+        Cache a response
+        
+        Args:
+            generation: Value of self.generation read before retrieval; the
+                result is dropped if documents were invalidated since
+            version: Document version read before retrieval (see lookup)
+        """
+        key = self.partition_key(document_ids, model, top_k)
+        vector = self._normalize(query_embedding)
+        
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            
+            index = self.partitions.get(key)
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+                self.partitions[key] = index
+            
+            entry_id = self.next_id
+            self.next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self.entries[entry_id] = {
+                'partition': key,
+                'query': query,
+                'result': result,
+                'version': version,
+                'created_at': time.time()
+            }
+            
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+    
+    def _remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id)
+        index = self.partitions[entry['partition']]
+        index.remove_ids(faiss.IDSelectorBatch(np.array([entry_id], dtype=np.int64)))
+        if index.ntotal == 0:
+            del self.partitions[entry['partition']]
+    
+    def invalidate_documents(self, document_ids: List[str]) -> int:
+        """
+        Drop every partition that involves any of the documents
+        
+        Partitions cached without a document filter searched all documents
+        and are dropped as well.
+        
+        Returns:
+            Number of entries removed
+        """
+        changed = set(document_ids)
+        with self._lock:
+            self.generation += 1
+            stale = [key for key in self.partitions if not key[0] or key[0] & changed]
+            removed = 0
+            for key in stale:
+                del self.partitions[key]
+            if stale:
+                stale = set(stale)
+                for entry_id in [i for i, e in self.entries.items() if e['partition'] in stale]:
+                    del self.entries[entry_id]
+                    removed += 1
+            return removed
+    
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.partitions.clear()
+            self.entries.clear()
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'partitions': len(self.partitions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Singleton instance
+response_cache = None
+
+def get_response_cache(**options) -> ResponseCache:
+    """Get or create response cache instance"""
+    global response_cache
+    if response_cache is None:
+        response_cache = ResponseCache(**options)
+    return response_cache
@@ -1,12 +1,23 @@
 """
 SQLite Database Layer - SQLAlchemy Models and Operations
 """
-from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, DateTime, Text, JSON
+from sqlalchemy import create_engine, event, bindparam, insert, select, Index, PrimaryKeyConstraint, Column, String, Integer, Float, Boolean, DateTime, Text, JSON, and_, or_, func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from datetime import datetime
-from typing import List, Optional, Dict
+from sqlalchemy.pool import QueuePool, StaticPool
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Dict, Tuple
+import bisect
 import json
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -26,6 +37,10 @@ class Document(Base):
     file_path = Column(String)
     file_size = Column(Integer)
     metadata = Column(JSON)
+    
+    __table_args__ = (
+        Index("ix_documents_upload_date", "upload_date"),
+    )
 
 
 class Chunk(Base):
@@ -41,6 +56,10 @@ class Chunk(Base):
     embedding_id = Column(String)  # FAISS index ID
     quality_score = Column(Float)
     section = Column(String)
+    
+    __table_args__ = (
+        Index("ix_chunks_document_id_chunk_index", "document_id", "chunk_index"),
+    )
 
 
 class Entity(Base):
@@ -54,6 +73,10 @@ class Entity(Base):
     confidence = Column(Float)
     document_id = Column(String)
     chunk_id = Column(String)
+    
+    __table_args__ = (
+        Index("ix_entities_document_id", "document_id"),
+    )
 
 
 class ChatHistory(Base):
@@ -70,6 +93,10 @@ class ChatHistory(Base):
     model = Column(String)
     tokens_input = Column(Integer)
     tokens_output = Column(Integer)
+    
+    __table_args__ = (
+        Index("ix_chat_history_session_id_turn_number", "session_id", "turn_number"),
+    )
 
 
 class QueryLog(Base):
@@ -88,7 +115,13 @@ class QueryLog(Base):
     tokens_output = Column(Integer)
     cost = Column(Float)
     latency = Column(Float)
+    cache_hit = Column(Boolean, default=False)  # served from the response cache
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_query_logs_timestamp", "timestamp"),
+        Index("ix_query_logs_approach_timestamp", "approach", "timestamp"),
+    )
 
 
 class ComparisonResult(Base):
@@ -105,172 +138,819 @@ class ComparisonResult(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+class IngestJob(Base):
+    """Background document ingestion queue"""
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(String, primary_key=True)
+    document_id = Column(String, nullable=False)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text)
+    chunks_created = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)  # retry backoff
+    updated_at = Column(DateTime, default=datetime.utcnow)  # worker heartbeat
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_available_at", "status", "available_at"),
+        Index("ix_ingest_jobs_document_id_created_at", "document_id", "created_at"),
+    )
+
+
+class QueryMetricsHourly(Base):
+    """Per hour, approach and model totals of query_logs (maintained on insert)"""
+    __tablename__ = "query_metrics_hourly"
+    
+    hour = Column(DateTime, nullable=False)
+    approach = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    count = Column(Integer, default=0)
+    cache_hits = Column(Integer, default=0)
+    tokens_input_sum = Column(Integer, default=0)
+    tokens_output_sum = Column(Integer, default=0)
+    cost_sum = Column(Float, default=0.0)
+    latency_sum = Column(Float, default=0.0)
+    quality_sum = Column(Float, default=0.0)
+    quality_count = Column(Integer, default=0)  # rows with a quality score
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("hour", "approach", "model"),
+    )
+
+
+class QueryMetricsHistogram(Base):
+    """Per hour, approach and model bucket counts of cost, latency and quality"""
+    __tablename__ = "query_metrics_histogram"
+    
+    hour = Column(DateTime, nullable=False)
+    approach = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    metric = Column(String, nullable=False)  # cost, latency, quality
+    bucket = Column(Integer, nullable=False)  # index into METRIC_BUCKETS[metric]
+    count = Column(Integer, default=0)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("hour", "approach", "model", "metric", "bucket"),
+    )
+
+
+# Histogram bucket upper bounds; values above the last bound fall in one
+# overflow bucket. Percentiles are interpolated within a bucket.
+METRIC_BUCKETS = {
+    'latency': [0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 60],  # seconds
+    'cost': [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1],  # USD
+    'quality': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0]
+}
+
+
+# QueryLog columns the rollups are computed from
+ROLLUP_COLUMNS = (
+    'timestamp', 'approach', 'model', 'cache_hit', 'tokens_input', 'tokens_output',
+    'cost', 'latency', 'quality_score'
+)
+
+# Additive QueryMetricsHourly columns
+ROLLUP_SUMS = (
+    'count', 'cache_hits', 'tokens_input_sum', 'tokens_output_sum',
+    'cost_sum', 'latency_sum', 'quality_sum', 'quality_count'
+)
+
+
+def _hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _aggregate_query_logs(rows: List[Dict]) -> Tuple[Dict[tuple, Dict], Dict[tuple, int]]:
+    """
+    Aggregate query_logs rows the way the hourly rollup tables store them
+    
+    Returns:
+        Rollup rows keyed by (hour, approach, model), and histogram counts
+        keyed by (hour, approach, model, metric, bucket)
+    """
+    totals: Dict[tuple, Dict] = {}
+    buckets: Dict[tuple, int] = {}
+    for row in rows:
+        key = (
+            _hour(row.get('timestamp') or datetime.utcnow()),
+            row.get('approach') or 'unknown',
+            row.get('model') or 'unknown'
+        )
+        group = totals.get(key)
+        if group is None:
+            group = totals[key] = {
+                'hour': key[0], 'approach': key[1], 'model': key[2],
+                'count': 0, 'cache_hits': 0, 'tokens_input_sum': 0, 'tokens_output_sum': 0,
+                'cost_sum': 0.0, 'latency_sum': 0.0, 'quality_sum': 0.0, 'quality_count': 0
+            }
+        group['count'] += 1
+        group['cache_hits'] += 1 if row.get('cache_hit') else 0
+        group['tokens_input_sum'] += row.get('tokens_input') or 0
+        group['tokens_output_sum'] += row.get('tokens_output') or 0
+        group['cost_sum'] += row.get('cost') or 0.0
+        group['latency_sum'] += row.get('latency') or 0.0
+        
+        values = {'cost': row.get('cost') or 0.0, 'latency': row.get('latency') or 0.0}
+        if row.get('quality_score') is not None:
+            group['quality_sum'] += row['quality_score']
+            group['quality_count'] += 1
+            values['quality'] = row['quality_score']
+        for metric, value in values.items():
+            bucket_key = key + (metric, bisect.bisect_left(METRIC_BUCKETS[metric], value))
+            buckets[bucket_key] = buckets.get(bucket_key, 0) + 1
+    return totals, buckets
+
+
+def _rollup_query_logs(conn, rows: List[Dict]):
+    """
+    Add query_logs rows to the hourly rollup tables
+    
+    Rows are aggregated in Python first, so a batch costs one upsert per
+    touched (hour, approach, model) group and histogram bucket.
+    
+    Args:
+        conn: Connection or Session the query_logs rows are written with
+        rows: QueryLog column values (timestamp defaults to now)
+    """
+    totals, buckets = _aggregate_query_logs(rows)
+    if not totals:
+        return
+    
+    stmt = sqlite_insert(QueryMetricsHourly)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['hour', 'approach', 'model'],
+            set_={name: getattr(QueryMetricsHourly, name) + getattr(stmt.excluded, name) for name in ROLLUP_SUMS}
+        ),
+        list(totals.values())
+    )
+    
+    stmt = sqlite_insert(QueryMetricsHistogram)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['hour', 'approach', 'model', 'metric', 'bucket'],
+            set_={'count': QueryMetricsHistogram.count + stmt.excluded.count}
+        ),
+        [
+            {'hour': hour, 'approach': approach, 'model': model, 'metric': metric, 'bucket': bucket, 'count': count}
+            for (hour, approach, model, metric, bucket), count in buckets.items()
+        ]
+    )
+
+
+def _percentile(counts: Dict[int, int], bounds: List[float], q: float) -> Optional[float]:
+    """Estimate the q-quantile from bucket counts by linear interpolation within the bucket"""
+    total = sum(counts.values())
+    if total == 0:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket in sorted(counts):
+        count = counts[bucket]
+        if seen + count >= rank:
+            lower = bounds[bucket - 1] if bucket > 0 else 0.0
+            if bucket >= len(bounds):
+                # Overflow bucket has no upper bound; report its lower edge
+                return lower
+            return lower + (bounds[bucket] - lower) * (rank - seen) / count
+        seen += count
+    return bounds[-1]
+
+
+# Schema migrations
+#
+# create_all only creates missing tables, so every change to an existing table
+# (columns, indexes, FTS) is a numbered migration. Migrations run in order,
+# each in its own transaction, and must be idempotent: on a fresh database
+# create_all has already built the current schema and they only record the
+# version.
+def _add_column(conn, table: str, column: str, ddl: str):
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+    if column not in existing:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN "{column}" {ddl}'))
+
+
+def _migration_1_query_log_cache_hit(conn):
+    _add_column(conn, "query_logs", "cache_hit", "BOOLEAN DEFAULT 0")
+
+
+def _migration_2_chunks_fts(conn):
+    """FTS5 index over chunk text; document_id is indexed (zero BM25 weight) for filters and deletes"""
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+        "text, document_id, chunk_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    if conn.execute(text("SELECT COUNT(*) FROM chunks_fts")).scalar() == 0:
+        conn.execute(text(
+            "INSERT INTO chunks_fts (text, document_id, chunk_id) SELECT text, document_id, id FROM chunks"
+        ))
+
+
+def _migration_3_hot_query_indexes(conn):
+    for table in (Document, Chunk, Entity, ChatHistory, QueryLog, IngestJob):
+        for index in table.__table__.indexes:
+            columns = ", ".join(column.name for column in index.columns)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index.name} ON {table.__tablename__} ({columns})"))
+
+
+def _migration_4_query_metrics_rollup(conn):
+    """Rebuild the hourly rollups from query_logs (create_all has created the tables)"""
+    conn.execute(text("DELETE FROM query_metrics_hourly"))
+    conn.execute(text("DELETE FROM query_metrics_histogram"))
+    columns = [
+        QueryLog.approach, QueryLog.model, QueryLog.cost, QueryLog.latency, QueryLog.quality_score,
+        QueryLog.tokens_input, QueryLog.tokens_output, QueryLog.cache_hit, QueryLog.timestamp
+    ]
+    result = conn.execute(select(*columns))
+    while True:
+        batch = result.fetchmany(5000)
+        if not batch:
+            break
+        _rollup_query_logs(conn, [dict(row._mapping) for row in batch])
+
+
+MIGRATIONS = [
+    (1, "query_logs.cache_hit", _migration_1_query_log_cache_hit),
+    (2, "chunks_fts full-text index", _migration_2_chunks_fts),
+    (3, "indexes for hot filters and sorts", _migration_3_hot_query_indexes),
+    (4, "hourly query metrics rollup", _migration_4_query_metrics_rollup),
+]
+
+
+class _QueueFull(Exception):
+    """Aborts a create_ingest_jobs transaction that would exceed its limit"""
+
+
 # Database Manager
 class DatabaseManager:
     """SQLite database operations manager"""
     
-    def __init__(self, database_url: str = "sqlite:///./truecontext.db"):
-        self.engine = create_engine(database_url, echo=False)
-        self.SessionLocal = sessionmaker(bind=self.engine)
-        Base.metadata.create_all(self.engine)
+    def __init__(
+        self,
+        database_url: str = "sqlite:///./truecontext.db",
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        busy_timeout: float = 30.0
+    ):
+        """
+        Initialize database manager
+        
+        Args:
+            database_url: SQLAlchemy database URL
+            pool_size: Connections kept open in the pool
+            max_overflow: Extra connections allowed under burst load
+            busy_timeout: Seconds a SQLite writer waits for the lock before failing
+        """
+        engine_options = {}
+        if database_url.startswith("sqlite"):
+            engine_options['connect_args'] = {'check_same_thread': False, 'timeout': busy_timeout}
+            if database_url in ("sqlite://", "sqlite:///:memory:"):
+                # One shared connection, otherwise every connection is a new empty database
+                engine_options['poolclass'] = StaticPool
+            else:
+                engine_options.update(poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow)
+        else:
+            engine_options.update(pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+        
+        self.engine = create_engine(database_url, echo=False, **engine_options)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", self._configure_sqlite_connection)
+        
+        # Statement and transaction counters (see get_counters)
+        self.counters = {'statements': 0, 'statement_seconds': 0.0, 'commits': 0, 'rollbacks': 0}
+        self._counters_lock = threading.Lock()
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(self.engine, "commit", lambda conn: self._count('commits'))
+        event.listen(self.engine, "rollback", lambda conn: self._count('rollbacks'))
+        
+        # Loaded attributes stay usable after commit, so no refresh round-trip per write
+        self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self._scope: ContextVar[Optional[Session]] = ContextVar(f"db_session_{id(self)}", default=None)
+        self.schema_version = self._migrate()
+    
+    def _migrate(self) -> int:
+        """
+        Create missing tables and upgrade an existing database in place
+        
+        Everything runs in one transaction that takes the SQLite write lock
+        before reading the schema version, so when several workers start at
+        once each migration is applied by one of them; the others wait for
+        the lock and then skip what is already recorded.
+        
+        Returns:
+            Schema version after migrating
+        """
+        applied = []
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == "sqlite":
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            Base.metadata.create_all(conn)
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP)"
+            ))
+            current = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+            
+            for version, description, migrate in MIGRATIONS:
+                if version <= current:
+                    continue
+                migrate(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+                applied.append(f"{version}: {description}")
+                current = version
+        
+        for migration in applied:
+            logger.info(f"Applied schema migration {migration}")
+        return current
+    
+    @staticmethod
+    def _fts_phrase(value: str) -> str:
+        return '"' + value.replace('"', '""') + '"'
+    
+    @staticmethod
+    def fts_query(query: str, max_terms: int = 32) -> Optional[str]:
+        """
+        Turn free text into an FTS5 OR-query
+        
+        Each whitespace-separated word becomes a phrase of its word parts, so
+        identifiers such as "PN-12345" or "4.2.1" match as a token sequence.
+        """
+        terms = []
+        for word in query.split():
+            parts = re.findall(r"\w+", word)
+            if parts:
+                phrase = DatabaseManager._fts_phrase(" ".join(parts))
+                if phrase not in terms:
+                    terms.append(phrase)
+        return " OR ".join(terms[:max_terms]) or None
+    
+    def _delete_fts_document(self, session: Session, doc_id: str):
+        session.execute(
+            text("DELETE FROM chunks_fts WHERE chunks_fts MATCH :match"),
+            {'match': f"document_id : {self._fts_phrase(doc_id)}"}
+        )
+    
+    @staticmethod
+    def _configure_sqlite_connection(dbapi_connection, connection_record):
+        """WAL lets readers proceed during a write; NORMAL syncs only at checkpoints"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+    
+    def _count(self, name: str, amount=1):
+        with self._counters_lock:
+            self.counters[name] += amount
+    
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['statement_started'] = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('statement_started', time.perf_counter())
+        with self._counters_lock:
+            self.counters['statements'] += 1
+            self.counters['statement_seconds'] += elapsed
+    
+    def get_counters(self) -> Dict:
+        """Statement/transaction counters and connection pool usage"""
+        with self._counters_lock:
+            counters = dict(self.counters)
+        pool = self.engine.pool
+        counters['pool_checked_out'] = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+        counters['pool_size'] = pool.size() if hasattr(pool, 'size') else 1
+        return counters
+    
+    def ping(self):
+        """Round-trip a trivial query (raises if the database is unreachable)"""
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
     
     def get_session(self) -> Session:
         """Get database session"""
         return self.SessionLocal()
     
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """
+        Unit of work: one session and transaction, committed on success
+        
+        DatabaseManager calls made inside the block join it instead of opening
+        their own session, so a request's reads and writes share one
+        connection and commit (or roll back) together:
+            
+            with db_manager.session_scope():
+                db_manager.delete_chunks_by_document(doc_id)
+                db_manager.create_chunks(chunks)
+        """
+        session = self._scope.get()
+        if session is not None:
+            yield session
+            return
+        
+        session = self.SessionLocal()
+        token = self._scope.set(session)
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._scope.reset(token)
+            session.close()
+    
     # Document CRUD
     def create_document(self, doc_data: Dict) -> Document:
         """Create new document record"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             doc = Document(**doc_data)
             session.add(doc)
-            session.commit()
-            session.refresh(doc)
             return doc
-        finally:
-            session.close()
+    
+    def create_documents(self, docs_data: List[Dict]) -> List[Document]:
+        """Batch create document records"""
+        with self.session_scope() as session:
+            docs = [Document(**doc_data) for doc_data in docs_data]
+            session.add_all(docs)
+            return docs
     
     def get_document(self, doc_id: str) -> Optional[Document]:
         """Get document by ID"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             return session.query(Document).filter(Document.id == doc_id).first()
-        finally:
-            session.close()
     
     def list_documents(self, limit: int = 100) -> List[Document]:
         """List all documents"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             return session.query(Document).order_by(Document.upload_date.desc()).limit(limit).all()
-        finally:
-            session.close()
     
     def update_document_status(self, doc_id: str, status: str, processed: bool = False):
         """Update document processing status"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             doc = session.query(Document).filter(Document.id == doc_id).first()
             if doc:
                 doc.status = status
                 doc.processed = processed
-                session.commit()
-        finally:
-            session.close()
     
     def delete_document(self, doc_id: str):
         """Delete document and related data"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             # Delete chunks
             session.query(Chunk).filter(Chunk.document_id == doc_id).delete()
+            self._delete_fts_document(session, doc_id)
             # Delete entities
             session.query(Entity).filter(Entity.document_id == doc_id).delete()
             # Delete document
             session.query(Document).filter(Document.id == doc_id).delete()
-            session.commit()
-        finally:
-            session.close()
     
     # Chunk CRUD
     def create_chunks(self, chunks_data: List[Dict]) -> List[Chunk]:
         """Batch create chunks"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             chunks = [Chunk(**chunk_data) for chunk_data in chunks_data]
             session.bulk_save_objects(chunks)
-            session.commit()
+            # Keep the full-text index in the same transaction
+            if chunks_data:
+                session.execute(
+                    text("INSERT INTO chunks_fts (text, document_id, chunk_id) VALUES (:text, :document_id, :id)"),
+                    [
+                        {'text': c.get('text') or '', 'document_id': c.get('document_id'), 'id': c['id']}
+                        for c in chunks_data
+                    ]
+                )
             return chunks
-        finally:
-            session.close()
+    
+    def delete_chunks_by_document(self, doc_id: str):
+        """Delete a document's chunks (before re-processing it)"""
+        with self.session_scope() as session:
+            session.query(Chunk).filter(Chunk.document_id == doc_id).delete()
+            self._delete_fts_document(session, doc_id)
+    
+    def search_chunks_fts(self, query: str, limit: int = 10, document_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        BM25 full-text search over chunk text
+        
+        Returns:
+            Dicts with chunk_id, document_id and bm25 (lower is better), best first
+        """
+        match = self.fts_query(query)
+        if not match:
+            return []
+        match = f"text : ({match})"
+        if document_ids:
+            match += " AND document_id : (" + " OR ".join(self._fts_phrase(d) for d in set(document_ids)) + ")"
+        
+        with self.session_scope() as session:
+            rows = session.execute(
+                text(
+                    "SELECT chunk_id, document_id, bm25(chunks_fts, 1.0, 0.0) AS score FROM chunks_fts "
+                    "WHERE chunks_fts MATCH :match ORDER BY score LIMIT :limit"
+                ),
+                {'match': match, 'limit': limit}
+            ).all()
+            return [{'chunk_id': r[0], 'document_id': r[1], 'bm25': r[2]} for r in rows]
     
     def get_chunks_by_document(self, doc_id: str) -> List[Chunk]:
         """Get all chunks for a document"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             return session.query(Chunk).filter(Chunk.document_id == doc_id).order_by(Chunk.chunk_index).all()
-        finally:
-            session.close()
     
     # Entity CRUD
     def create_entities(self, entities_data: List[Dict]) -> List[Entity]:
         """Batch create entities"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             entities = [Entity(**entity_data) for entity_data in entities_data]
             session.bulk_save_objects(entities)
-            session.commit()
             return entities
-        finally:
-            session.close()
     
     # Chat History
     def create_chat_message(self, message_data: Dict) -> ChatHistory:
         """Create chat message"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             message = ChatHistory(**message_data)
             session.add(message)
-            session.commit()
-            session.refresh(message)
             return message
-        finally:
-            session.close()
     
     def get_chat_history(self, session_id: str, limit: int = 10) -> List[ChatHistory]:
         """Get chat history for session"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             return session.query(ChatHistory)\
                 .filter(ChatHistory.session_id == session_id)\
                 .order_by(ChatHistory.turn_number.desc())\
                 .limit(limit)\
                 .all()
-        finally:
-            session.close()
     
     # Query Logs
     def create_query_log(self, log_data: Dict) -> QueryLog:
         """Create query log"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             log = QueryLog(**log_data)
+            log.timestamp = log.timestamp or datetime.utcnow()
             session.add(log)
-            session.commit()
-            session.refresh(log)
+            _rollup_query_logs(session, [{**log_data, 'timestamp': log.timestamp}])
             return log
-        finally:
-            session.close()
     
     def get_query_logs(self, limit: int = 50) -> List[QueryLog]:
         """Get recent query logs"""
+        with self.session_scope() as session:
+            return session.query(QueryLog).order_by(QueryLog.timestamp.desc()).limit(limit).all()
+    
+    def get_query_metrics(self, window_hours: int = 24, quantiles=(0.5, 0.95, 0.99)) -> Dict:
+        """
+        Aggregate query metrics per approach and model over the last window_hours
+        
+        The window is rolling: whole hours are read from the hourly rollups and
+        the partial oldest hour from the raw query_logs rows after the window
+        start. Cost is independent of the total number of logged queries: at
+        most window_hours rollup rows per group, their histogram buckets and
+        under one hour of raw rows.
+        
+        Args:
+            window_hours: Window length in hours, ending now
+            quantiles: Percentiles reported for cost, latency and quality
+        
+        Returns:
+            Dict with window bounds, overall totals and a list of groups with
+            count, cache hits, tokens, averages and percentiles
+        """
+        now = datetime.utcnow()
+        since = now - timedelta(hours=window_hours)
+        first_hour = since if _hour(since) == since else _hour(since) + timedelta(hours=1)
+        
+        sums: Dict[tuple, Dict] = {}
+        histograms: Dict[tuple, Dict[int, int]] = {}
+        with self.session_scope() as session:
+            for approach, model, *values in session.query(
+                QueryMetricsHourly.approach,
+                QueryMetricsHourly.model,
+                *(func.sum(getattr(QueryMetricsHourly, name)) for name in ROLLUP_SUMS)
+            ).filter(QueryMetricsHourly.hour >= first_hour).group_by(
+                QueryMetricsHourly.approach, QueryMetricsHourly.model
+            ):
+                sums[(approach, model)] = dict(zip(ROLLUP_SUMS, values))
+            
+            for approach, model, metric, bucket, count in session.query(
+                QueryMetricsHistogram.approach,
+                QueryMetricsHistogram.model,
+                QueryMetricsHistogram.metric,
+                QueryMetricsHistogram.bucket,
+                func.sum(QueryMetricsHistogram.count)
+            ).filter(QueryMetricsHistogram.hour >= first_hour).group_by(
+                QueryMetricsHistogram.approach, QueryMetricsHistogram.model,
+                QueryMetricsHistogram.metric, QueryMetricsHistogram.bucket
+            ):
+                histograms.setdefault((approach, model, metric), {})[bucket] = count
+            
+            # Rows of the partial hour at the start of the window
+            tail = session.execute(
+                select(*(getattr(QueryLog, name) for name in ROLLUP_COLUMNS))
+                .where(QueryLog.timestamp >= since, QueryLog.timestamp < first_hour)
+            ).all()
+        
+        tail_totals, tail_buckets = _aggregate_query_logs([dict(row._mapping) for row in tail])
+        for (_, approach, model), group in tail_totals.items():
+            totals = sums.setdefault((approach, model), dict.fromkeys(ROLLUP_SUMS, 0))
+            for name in ROLLUP_SUMS:
+                totals[name] = (totals[name] or 0) + group[name]
+        for (_, approach, model, metric, bucket), count in tail_buckets.items():
+            counts = histograms.setdefault((approach, model, metric), {})
+            counts[bucket] = counts.get(bucket, 0) + count
+        
+        groups = []
+        for (approach, model), totals in sums.items():
+            count, quality_count = totals['count'], totals['quality_count']
+            group = {
+                'approach': approach,
+                'model': model,
+                'count': count,
+                'cache_hits': totals['cache_hits'],
+                'tokens_input': totals['tokens_input_sum'],
+                'tokens_output': totals['tokens_output_sum'],
+                'total_cost': totals['cost_sum'],
+                'avg_cost': totals['cost_sum'] / count if count else 0.0,
+                'avg_latency': totals['latency_sum'] / count if count else 0.0,
+                'quality_count': quality_count,
+                'avg_quality': totals['quality_sum'] / quality_count if quality_count else None
+            }
+            for metric, bounds in METRIC_BUCKETS.items():
+                counts = histograms.get((approach, model, metric), {})
+                for q in quantiles:
+                    group[f"p{round(q * 100):g}_{metric}"] = _percentile(counts, bounds, q)
+            groups.append(group)
+        groups.sort(key=lambda g: -g['count'])
+        
+        return {
+            'window_hours': window_hours,
+            'window_start': since.isoformat(),
+            'window_end': now.isoformat(),
+            'total_queries': sum(g['count'] for g in groups),
+            'total_cost': sum(g['total_cost'] for g in groups),
+            'groups': groups
+        }
+    
+    # Ingest Jobs
+    def create_ingest_jobs(self, jobs_data: List[Dict], max_in_flight: Optional[int] = None) -> Optional[List[IngestJob]]:
+        """
+        Batch enqueue ingest jobs
+        
+        Args:
+            jobs_data: IngestJob column values
+            max_in_flight: Limit on queued plus running jobs. Each insert counts
+                them in the same statement, under the write lock, so concurrent
+                submitters cannot push the queue past it
+        
+        Returns:
+            The created jobs, or None (nothing queued) if they do not all fit
+        """
+        if max_in_flight is None:
+            with self.session_scope() as session:
+                jobs = [IngestJob(**job_data) for job_data in jobs_data]
+                session.add_all(jobs)
+                return jobs
+        
+        table = IngestJob.__table__
+        columns = ['id', 'document_id', 'status', 'attempts', 'max_attempts', 'created_at', 'available_at', 'updated_at']
+        in_flight = select(func.count()).select_from(table)\
+            .where(or_(table.c.status == "queued", table.c.status == "running")).scalar_subquery()
+        stmt = insert(table).from_select(
+            columns,
+            select(*(bindparam(name, type_=table.c[name].type) for name in columns))
+            .where(in_flight < bindparam('max_in_flight'))
+        )
+        try:
+            with self.session_scope() as session:
+                inserted = session.connection().execute(stmt, [
+                    {'attempts': 0, **job_data, 'max_in_flight': max_in_flight} for job_data in jobs_data
+                ]).rowcount
+                if inserted < len(jobs_data):
+                    # Roll back the jobs that did fit: the batch is all or nothing
+                    raise _QueueFull()
+                jobs = {job.id: job for job in session.query(IngestJob).filter(
+                    IngestJob.id.in_([job_data['id'] for job_data in jobs_data])
+                )}
+                return [jobs[job_data['id']] for job_data in jobs_data]
+        except _QueueFull:
+            return None
+    
+    def claim_ingest_job(self, lease_seconds: int = 1800) -> Optional[IngestJob]:
+        """
+        Atomically claim the next runnable job
+        
+        Queued jobs whose backoff has elapsed are runnable, as are running jobs
+        whose worker stopped heart-beating for lease_seconds (crashed process).
+        """
         session = self.get_session()
         try:
-            return session.query(QueryLog).order_by(QueryLog.timestamp.desc()).limit(limit).all()
+            now = datetime.utcnow()
+            runnable = or_(
+                and_(IngestJob.status == "queued", IngestJob.available_at <= now),
+                and_(IngestJob.status == "running", IngestJob.updated_at < now - timedelta(seconds=lease_seconds))
+            )
+            while True:
+                job = session.query(IngestJob).filter(runnable).order_by(IngestJob.created_at).first()
+                if job is None:
+                    return None
+                # Compare-and-set so two workers never claim the same job
+                claimed = session.query(IngestJob)\
+                    .filter(IngestJob.id == job.id, IngestJob.status == job.status, IngestJob.updated_at == job.updated_at)\
+                    .update({
+                        IngestJob.status: "running",
+                        IngestJob.attempts: IngestJob.attempts + 1,
+                        IngestJob.updated_at: now
+                    }, synchronize_session=False)
+                session.commit()
+                if claimed:
+                    session.refresh(job)
+                    return job
         finally:
             session.close()
     
+    def heartbeat_ingest_job(self, job_id: str):
+        """Extend a running job's lease"""
+        self.update_ingest_job(job_id, updated_at=datetime.utcnow())
+    
+    def complete_ingest_job(self, job_id: str, chunks_created: int):
+        """Mark a job done"""
+        now = datetime.utcnow()
+        self.update_ingest_job(
+            job_id, status="done", chunks_created=chunks_created, error=None, updated_at=now, finished_at=now
+        )
+    
+    def fail_ingest_job(self, job_id: str, error: str, retry_delay: float = 0, retry: bool = True) -> Optional[IngestJob]:
+        """Record a failed attempt; requeue with backoff while attempts remain (unless retry is False)"""
+        with self.session_scope() as session:
+            job = session.query(IngestJob).filter(IngestJob.id == job_id).first()
+            if job:
+                now = datetime.utcnow()
+                job.error = error
+                job.updated_at = now
+                if retry and job.attempts < job.max_attempts:
+                    job.status = "queued"
+                    job.available_at = now + timedelta(seconds=retry_delay)
+                else:
+                    job.status = "failed"
+                    job.finished_at = now
+            return job
+    
+    def update_ingest_job(self, job_id: str, **fields):
+        """Update ingest job fields"""
+        with self.session_scope() as session:
+            session.query(IngestJob).filter(IngestJob.id == job_id).update(fields, synchronize_session=False)
+    
+    def get_ingest_job(self, job_id: str) -> Optional[IngestJob]:
+        """Get ingest job by ID"""
+        with self.session_scope() as session:
+            return session.query(IngestJob).filter(IngestJob.id == job_id).first()
+    
+    def get_latest_ingest_job(self, document_id: str) -> Optional[IngestJob]:
+        """Most recent ingest job for a document"""
+        with self.session_scope() as session:
+            return session.query(IngestJob)\
+                .filter(IngestJob.document_id == document_id)\
+                .order_by(IngestJob.created_at.desc())\
+                .first()
+    
+    def count_ingest_jobs(self) -> Dict[str, int]:
+        """Number of ingest jobs per status"""
+        with self.session_scope() as session:
+            return dict(session.query(IngestJob.status, func.count(IngestJob.id)).group_by(IngestJob.status).all())
+    
+    # Bulk writes
+    def bulk_insert(self, model, rows: List[Dict]):
+        """
+        Insert many rows of one model as a single executemany (no objects loaded back)
+        
+        QueryLog rows also update the hourly metrics rollups in the same transaction.
+        """
+        if rows:
+            with self.session_scope() as session:
+                session.execute(insert(model), rows)
+                if model is QueryLog:
+                    _rollup_query_logs(session, rows)
+    
     # Comparison Results
     def create_comparison(self, comparison_data: Dict) -> ComparisonResult:
         """Create comparison result"""
-        session = self.get_session()
-        try:
+        with self.session_scope() as session:
             comparison = ComparisonResult(**comparison_data)
             session.add(comparison)
-            session.commit()
-            session.refresh(comparison)
             return comparison
-        finally:
-            session.close()
 
 
 # Singleton instance
 db_manager = None
 
-def get_db_manager(database_url: str = "sqlite:///./truecontext.db") -> DatabaseManager:
+def get_db_manager(database_url: str = "sqlite:///./truecontext.db", **engine_options) -> DatabaseManager:
     """Get or create database manager instance"""
     global db_manager
     if db_manager is None:
-        db_manager = DatabaseManager(database_url)
+        db_manager = DatabaseManager(database_url, **engine_options)
     return db_manager
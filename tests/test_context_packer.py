@@ -0,0 +1,44 @@
+"""
+Tests for token-budgeted context packing
+"""
+import numpy as np
+
+from context_packer import ContextPacker
+
+
+class EmbeddingStore:
+    """Serves stored embeddings for search results, like the vector store"""
+    
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+    
+    def get_result_embeddings(self, results):
+        return np.array([self.embeddings[r['id']] for r in results], dtype=np.float32)
+
+
+def test_top_chunk_larger_than_budget_is_truncated():
+    chunks = [
+        {'id': "big", 'document_id': "doc", 'chunk_index': 0, 'text': "x" * 4000, 'tokens': 1000, 'score': 0.9},
+        {'id': "small", 'document_id': "doc", 'chunk_index': 5, 'text': "y" * 400, 'tokens': 100, 'score': 0.5},
+    ]
+    store = EmbeddingStore({"big": [1.0, 0.0], "small": [0.0, 1.0]})
+    packed = ContextPacker(store, token_budget=200).pack(chunks)
+    
+    assert [p['id'] for p in packed['chunks']] == ["big"]
+    assert packed['chunks'][0]['truncated']
+    assert packed['chunks'][0]['text'] == "x" * 800
+    assert packed['budget_used'] == 200
+    assert packed['dropped_budget'] == 1
+
+
+def test_chunks_within_budget_are_kept_whole():
+    chunks = [
+        {'id': "a", 'document_id': "doc", 'chunk_index': 0, 'text': "a" * 400, 'tokens': 100, 'score': 0.9},
+        {'id': "b", 'document_id': "doc", 'chunk_index': 1, 'text': "b" * 400, 'tokens': 100, 'score': 0.8},
+    ]
+    store = EmbeddingStore({"a": [1.0, 0.0], "b": [0.0, 1.0]})
+    packed = ContextPacker(store, token_budget=200).pack(chunks)
+    
+    assert packed['chunks'][0]['chunk_ids'] == ["a", "b"]
+    assert packed['budget_used'] == 200
+    assert 'truncated' not in packed['chunks'][0]
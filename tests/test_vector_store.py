@@ -0,0 +1,37 @@
+"""
+Regression tests for FAISSVectorStore search and deletion
+"""
+import numpy as np
+
+from vector_store import FAISSVectorStore
+
+
+def make_store(path, index_type: str, count: int = 500, dimension: int = 32):
+    store = FAISSVectorStore(dimension, str(path), index_type=index_type)
+    vectors = np.random.default_rng(0).random((count, dimension), dtype=np.float32)
+    store.add_embeddings(
+        vectors.copy(),
+        [{'id': f"chunk-{i}", 'document_id': f"doc-{i % 10}"} for i in range(count)]
+    )
+    return store, vectors
+
+
+def test_unfiltered_hnsw_search_after_delete(tmp_path):
+    store, vectors = make_store(tmp_path, "hnsw")
+    assert store.delete_by_document_id("doc-1") == 50
+    
+    # The deleted IDs are excluded through an IDSelectorNot that must outlive the search
+    for _ in range(20):
+        results = store.search(vectors[:1].copy(), top_k=10)
+        assert len(results) == 10
+        assert results[0]['id'] == "chunk-0"
+        assert all(r['document_id'] != "doc-1" for r in results)
+
+
+def test_filtered_search_returns_only_allowed_documents(tmp_path):
+    for index_type in ("flat", "hnsw"):
+        store, vectors = make_store(tmp_path / index_type, index_type)
+        for _ in range(20):
+            results = store.search(vectors[:1].copy(), top_k=10, document_ids=["doc-3", "doc-7"])
+            assert len(results) == 10
+            assert {r['document_id'] for r in results} <= {"doc-3", "doc-7"}
@@ -3,37 +3,612 @@ FAISS Vector Store - Embedding Storage and Similarity Search
 """
 import faiss
 import numpy as np
+import fcntl
+import functools
+import glob
+import heapq
+import json
 import pickle
 import os
-from typing import List, Dict, Tuple, Optional
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Iterable
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Supported index backends
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Process roles for get_vector_store: one writer per index_path, any number of readers
+STORE_MODES = ("writer", "reader", "auto")
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """Raised when a read-only store is asked to change the index"""
+
+
+def _synchronized(method):
+    """Run a store method under the store's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class EmbeddingSidecar:
+    """
+    Append-only, memory-mapped matrix of raw embeddings stored next to the index
+    
+    Row i holds the vector for FAISS ID i. Rows are never rewritten in place;
+    deleted IDs keep their rows until the store is compacted.
+    """
+    
+    MAGIC = b"FVEC"
+    HEADER = struct.Struct("<4sIII")  # magic, version, dimension, itemsize
+    DTYPES = {4: np.float32, 2: np.float16}
+    
+    def __init__(self, path: str, dimension: int, dtype: str = "float32", read_only: bool = False):
+        """
+        Open (or create) a sidecar file
+        
+        Args:
+            path: File path, conventionally {index_path}/{name}.vectors
+            dimension: Embedding dimension
+            dtype: float32 or float16 for new files; existing files keep theirs
+            read_only: Map a file another process appends to (never creates,
+                truncates or appends)
+        """
+        self.path = path
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.read_only = read_only
+        
+        if os.path.exists(path) and os.path.getsize(path) >= self.HEADER.size:
+            with open(path, 'rb') as f:
+                magic, _, file_dimension, itemsize = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC or file_dimension != dimension:
+                raise ValueError(f"Embedding file {path} does not match dimension {dimension}")
+            self.dtype = np.dtype(self.DTYPES[itemsize])
+        elif read_only:
+            raise FileNotFoundError(f"Embedding file {path} not found")
+        else:
+            with open(path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, 1, dimension, self.dtype.itemsize))
+        
+        self.row_bytes = dimension * self.dtype.itemsize
+        self._file = None
+        self._mmap = None
+        if read_only:
+            self.refresh()
+            return
+        
+        # Drop a partially written trailing row left by a crash mid-append
+        data_bytes = os.path.getsize(path) - self.HEADER.size
+        self.rows = data_bytes // self.row_bytes
+        if data_bytes % self.row_bytes:
+            with open(path, 'r+b') as f:
+                f.truncate(self.HEADER.size + self.rows * self.row_bytes)
+        
+        self._file = open(path, 'ab')
+    
+    def append(self, start_id: int, vectors: np.ndarray):
+        """Append vectors for IDs start_id.. (gaps are zero-filled)"""
+        if start_id < self.rows:
+            raise ValueError(f"Embedding rows are append-only: row {start_id} already written")
+        if start_id > self.rows:
+            self._file.write(bytes((start_id - self.rows) * self.row_bytes))
+        self._file.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        self._file.flush()
+        self.rows = start_id + len(vectors)
+    
+    def get(self, ids) -> np.ndarray:
+        """Read vectors for FAISS IDs as float32, shape (n, dimension)"""
+        if self._mmap is None or self._mmap.shape[0] != self.rows:
+            self._mmap = np.memmap(
+                self.path, dtype=self.dtype, mode='r',
+                offset=self.HEADER.size, shape=(self.rows, self.dimension)
+            ) if self.rows else np.empty((0, self.dimension), dtype=self.dtype)
+        return np.asarray(self._mmap[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+    
+    def refresh(self):
+        """Pick up rows appended by the writer process (read-only files)"""
+        # A row being appended right now is not counted until it is complete
+        self.rows = (os.path.getsize(self.path) - self.HEADER.size) // self.row_bytes
+    
+    def truncate(self, rows: int):
+        """Drop rows from the end of the file"""
+        self._file.flush()
+        self._file.truncate(self.HEADER.size + rows * self.row_bytes)
+        self.rows = rows
+        self._mmap = None
+    
+    def flush(self):
+        """Flush appended rows to stable storage"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def close(self):
+        self._mmap = None
+        if self._file is not None:
+            self._file.close()
+    
+    @classmethod
+    def write(cls, path: str, vectors: np.ndarray, dtype) -> "EmbeddingSidecar":
+        """Atomically replace the file at path with the given rows"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, 1, vectors.shape[1], np.dtype(dtype).itemsize))
+            f.write(np.ascontiguousarray(vectors, dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return cls(path, vectors.shape[1], dtype)
+
+
+class MetadataStore:
+    """
+    On-disk chunk metadata keyed by FAISS ID, backed by SQLite
+    
+    Nothing is held in memory: opening is constant time and lookups only
+    materialize the rows that are asked for (e.g. the hits of a search).
+    Pages are read through a shared memory mapping, so processes opening the
+    same file share one copy in the OS page cache.
+    """
+    
+    # Metadata keys stored as columns; anything else goes to the JSON `extra` column
+    COLUMNS = ('document_id', 'chunk_index', 'text', 'tokens')
+    
+    def __init__(self, path: str, mmap_size: int = 1 << 30):
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps each small commit cheap; a crash can only lose whole transactions
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                faiss_id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL,
+                document_id TEXT,
+                chunk_index INTEGER,
+                tokens INTEGER,
+                text TEXT,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunks_chunk_id ON chunks (chunk_id);
+            CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id, faiss_id);
+            CREATE TABLE IF NOT EXISTS tombstones (faiss_id INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS store_state (key TEXT PRIMARY KEY, value TEXT);
+            -- Sequence number of each document's last change, shared by every process
+            CREATE TABLE IF NOT EXISTS document_versions (document_id TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS ix_document_versions_version ON document_versions (version);
+        """)
+    
+    def add(self, ids: Iterable[int], metadata: List[Dict]):
+        """Insert metadata rows for the given FAISS IDs"""
+        rows = []
+        for idx, meta in zip(ids, metadata):
+            extra = {k: v for k, v in meta.items() if k != 'id' and k not in self.COLUMNS}
+            rows.append((
+                int(idx), meta['id'], meta.get('document_id'), meta.get('chunk_index'),
+                meta.get('tokens'), meta.get('text'), json.dumps(extra) if extra else None
+            ))
+        with self._lock:
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (faiss_id, chunk_id, document_id, chunk_index, tokens, text, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._bump_versions({meta.get('document_id') or '' for meta in metadata})
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+    
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        """Materialize metadata dicts for the given FAISS IDs"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT faiss_id, chunk_id, document_id, chunk_index, tokens, text, extra "
+                f"FROM chunks WHERE faiss_id IN ({','.join('?' * len(ids))})",
+                ids
+            ).fetchall()
+        results = {}
+        for faiss_id, chunk_id, document_id, chunk_index, tokens, text, extra in rows:
+            meta = {
+                'id': chunk_id,
+                'document_id': document_id,
+                'chunk_index': chunk_index,
+                'text': text,
+                'tokens': tokens
+            }
+            if extra:
+                meta.update(json.loads(extra))
+            results[faiss_id] = meta
+        return results
+    
+    def faiss_id(self, chunk_id: str) -> Optional[int]:
+        """Look up the FAISS ID of a chunk"""
+        with self._lock:
+            row = self.conn.execute("SELECT faiss_id FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        return row[0] if row else None
+    
+    def faiss_ids(self, chunk_ids: Iterable[str]) -> Dict[str, int]:
+        """Look up the FAISS IDs of many chunks (unknown chunks are omitted)"""
+        chunk_ids = list(set(chunk_ids))
+        if not chunk_ids:
+            return {}
+        with self._lock:
+            return dict(self.conn.execute(
+                f"SELECT chunk_id, faiss_id FROM chunks WHERE chunk_id IN ({','.join('?' * len(chunk_ids))})",
+                chunk_ids
+            ).fetchall())
+    
+    def ids_for_documents(self, document_ids: Iterable[str]) -> np.ndarray:
+        """FAISS IDs belonging to the given documents (document posting lists)"""
+        document_ids = list(set(document_ids))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT faiss_id FROM chunks WHERE document_id IN ({','.join('?' * len(document_ids))})",
+                document_ids
+            ).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    
+    def delete_document(self, document_id: str) -> np.ndarray:
+        """Delete a document's rows, tombstone their FAISS IDs and return them"""
+        with self._lock:
+            ids = self.ids_for_documents([document_id])
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tombstones (faiss_id) SELECT faiss_id FROM chunks WHERE document_id = ?",
+                (document_id,)
+            )
+            self.conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self._bump_versions([document_id])
+            self.conn.commit()
+        return ids
+    
+    def _bump_versions(self, document_ids: Iterable[str]):
+        # Runs inside the caller's write transaction, so sequence numbers are
+        # unique across processes and become visible with the change itself
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO document_versions (document_id, version) "
+            "SELECT ?, COALESCE(MAX(version), 0) + 1 FROM document_versions",
+            ((document_id,) for document_id in document_ids)
+        )
+    
+    def document_version(self, document_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Version of a set of documents, or of the whole store when None
+        
+        The value changes whenever chunks of any of the documents are added or
+        deleted, by any process sharing the database.
+        """
+        with self._lock:
+            if not document_ids:
+                return self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM document_versions").fetchone()[0]
+            document_ids = list(set(document_ids))
+            return self.conn.execute(
+                "SELECT COALESCE(SUM(version), 0) FROM document_versions "
+                f"WHERE document_id IN ({','.join('?' * len(document_ids))})",
+                document_ids
+            ).fetchone()[0]
+    
+    def live_ids(self, start_id: int = 0) -> np.ndarray:
+        """All FAISS IDs (>= start_id) that still have metadata, ascending"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT faiss_id FROM chunks WHERE faiss_id >= ? ORDER BY faiss_id", (start_id,)
+            ).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    
+    def renumber(self):
+        """Renumber FAISS IDs to 0..n-1, preserving order (used by compaction)"""
+        with self._lock:
+            # New IDs never exceed old ones; go through negatives to avoid key collisions
+            self.conn.executescript("""
+                CREATE TEMP TABLE remap AS
+                    SELECT faiss_id AS old_id, ROW_NUMBER() OVER (ORDER BY faiss_id) - 1 AS new_id FROM chunks;
+                UPDATE chunks SET faiss_id = -1 - (SELECT new_id FROM remap WHERE old_id = chunks.faiss_id);
+                UPDATE chunks SET faiss_id = -1 - faiss_id;
+                DROP TABLE remap;
+                DELETE FROM tombstones;
+            """)
+    
+    def document_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(DISTINCT document_id) FROM chunks").fetchone()[0]
+    
+    def get_tombstones(self) -> set:
+        with self._lock:
+            return {r[0] for r in self.conn.execute("SELECT faiss_id FROM tombstones")}
+    
+    def set_tombstones(self, ids: set):
+        with self._lock:
+            self.conn.execute("DELETE FROM tombstones")
+            self.conn.executemany("INSERT INTO tombstones (faiss_id) VALUES (?)", ((int(i),) for i in ids))
+    
+    def add_tombstones(self, ids: Iterable[int]):
+        """Log deletions for IDs that have no metadata rows"""
+        with self._lock:
+            self.conn.executemany("INSERT OR IGNORE INTO tombstones (faiss_id) VALUES (?)", ((int(i),) for i in ids))
+            self.conn.commit()
+    
+    def clear_tombstones(self, ids: Iterable[int]):
+        """Forget deletions already reflected in a snapshot"""
+        with self._lock:
+            self.conn.executemany("DELETE FROM tombstones WHERE faiss_id = ?", ((int(i),) for i in ids))
+            self.conn.commit()
+    
+    def data_version(self) -> int:
+        """Changes whenever another connection (e.g. another process) commits"""
+        with self._lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def get_state(self) -> Dict:
+        """Store-level settings saved alongside the metadata"""
+        with self._lock:
+            return {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM store_state")}
+    
+    def set_state(self, state: Dict):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO store_state (key, value) VALUES (?, ?)",
+                ((k, json.dumps(v)) for k, v in state.items())
+            )
+    
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+    
+    def backup_to(self, path: str):
+        """Copy the (committed) database to another file"""
+        with self._lock:
+            dest = sqlite3.connect(path)
+            try:
+                self.conn.backup(dest)
+            finally:
+                dest.close()
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
 
 class FAISSVectorStore:
     """FAISS-based vector storage and search"""
     
-    def __init__(self, dimension: int = 1536, index_path: str = "./data/faiss_indices"):
+    def __init__(
+        self,
+        dimension: int = 1536,
+        index_path: str = "./data/faiss_indices",
+        index_type: str = "flat",
+        nlist: int = 1024,
+        hnsw_m: int = 32,
+        pq_m: int = 64,
+        train_size: Optional[int] = None,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        name: str = "default",
+        embedding_dtype: str = "float32",
+        checkpoint_min_vectors: int = 10000,
+        checkpoint_ratio: float = 0.1,
+        read_only: bool = False,
+        refresh_interval: float = 1.0
+    ):
         """
         Initialize FAISS vector store
         
         Args:
             dimension: Embedding dimension (1536 for text-embedding-3-small)
             index_path: Directory to save/load indices
+            index_type: Index backend - flat, ivf_flat, hnsw or ivf_pq
+            nlist: Number of IVF cells (ivf_flat, ivf_pq)
+            hnsw_m: Graph neighbours per node (hnsw)
+            pq_m: Number of PQ sub-quantizers, must divide dimension (ivf_pq)
+            train_size: Vectors to accumulate before training IVF indices
+            nprobe: Default IVF cells visited per query
+            ef_search: Default HNSW search depth per query
+            name: Index name used for the files in index_path
+            embedding_dtype: Storage type of the raw embedding file (float32/float16)
+            checkpoint_min_vectors: Changes logged before a snapshot is written
+            checkpoint_ratio: ...or this fraction of the snapshot size, if larger
+            read_only: Memory-map snapshots written by another (writer) process
+                instead of owning the index; see refresh()
+            refresh_interval: Seconds between checks for a newer snapshot (read_only)
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        
         self.dimension = dimension
         self.index_path = index_path
         os.makedirs(index_path, exist_ok=True)
         
-        # Create FAISS index (using IndexFlatIP for inner product/cosine similarity)
-        self.index = faiss.IndexFlatIP(dimension)
+        # FAISS indices are not safe for concurrent add/search; serialize access
+        self._lock = threading.RLock()
+        
+        self.name = name
+        self.embedding_dtype = embedding_dtype
+        self.index_type = index_type
+        self.nlist = nlist
+        self.hnsw_m = hnsw_m
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        if train_size is None:
+            # FAISS k-means wants ~39 points per centroid (256 centroids per PQ sub-quantizer)
+            train_size = 39 * nlist if index_type == "ivf_flat" else max(39 * nlist, 39 * 256)
+        self.train_size = train_size
+        
+        # IVF indices need training; until enough vectors arrive they live in a
+        # flat staging index that is searched exactly (inner product = cosine)
+        self.index = self._create_index() if not self._needs_training() else self._create_staging_index()
+        self.is_trained = not self._needs_training()
+        
+        # HNSW graphs cannot drop vectors; deleted IDs are masked out at search time
+        self.deleted_ids = set()
+        # Logged tombstones already reflected in self.index; the rest were
+        # written by reader processes and are folded in at the next checkpoint
+        self._applied_tombstones = set()
         
-        # Metadata storage (maps index position to chunk data)
-        self.id_to_metadata = {}
-        self.metadata_to_id = {}
         self.next_id = 0
+        
+        # Snapshot bookkeeping: the snapshot holds IDs < snapshot_next_id, later
+        # adds/deletes are replayed from the embedding file and metadata database
+        self.checkpoint_min_vectors = checkpoint_min_vectors
+        self.checkpoint_ratio = checkpoint_ratio
+        self.snapshot_generation = 0
+        self.snapshot_next_id = 0
+        self.pending_changes = 0
+        
+        # Read-only stores share the writer's snapshot through mmap and keep the
+        # vectors logged after it in a small private flat index
+        self.read_only = read_only
+        self.refresh_interval = refresh_interval
+        self.delta_index: Optional[faiss.Index] = None
+        self._manifest_signature = None
+        self._data_version = None
+        self._last_refresh = 0.0
+        
+        # Chunk metadata ({name}.metadata.db) and raw embeddings ({name}.vectors),
+        # opened on load or first add
+        self.metadata: Optional[MetadataStore] = None
+        self.embeddings: Optional[EmbeddingSidecar] = None
+        
+        # Operation counters since process start (see get_counters)
+        self.counters = {
+            'searches': 0,
+            'search_queries': 0,
+            'search_seconds': 0.0,
+            'vectors_added': 0,
+            'add_seconds': 0.0,
+            'vectors_deleted': 0,
+            'checkpoints': 0,
+            'checkpoint_seconds': 0.0,
+            'snapshot_reloads': 0
+        }
+    
+    def _needs_training(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq")
     
+    def _create_staging_index(self) -> faiss.Index:
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+    
+    def _create_index(self) -> faiss.Index:
+        """
+        Create an empty index for the configured backend
+        
+        All indices are addressed by stable external IDs: flat and HNSW are
+        wrapped in IndexIDMap2, IVF indices store the IDs natively.
+        """
+        if self.index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = self.ef_search
+            return faiss.IndexIDMap2(index)
+        
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        if self.index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, self.nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, self.dimension, self.nlist, self.pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = self.nprobe
+        return index
+    
+    def _maybe_train(self):
+        """Train the IVF index once the staging index holds enough vectors"""
+        if self.is_trained or self.index.ntotal < self.train_size:
+            return
+        
+        logger.info(f"Training {self.index_type} index on {self.index.ntotal} vectors")
+        self.index = self._build_index(faiss.vector_to_array(self.index.id_map))
+    
+    def _build_index(self, ids: np.ndarray) -> faiss.Index:
+        """Build a fresh index for the configured backend from stored embeddings"""
+        vectors = self.embeddings.get(ids) if len(ids) else np.empty((0, self.dimension), dtype=np.float32)
+        
+        if self._needs_training() and len(ids) < self.train_size:
+            self.is_trained = False
+            index = self._create_staging_index()
+        else:
+            self.is_trained = True
+            index = self._create_index()
+            if self._needs_training():
+                index.train(vectors)
+                # Hashtable direct map gives O(1) reconstruct and per-ID removal
+                index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        return index
+    
+    def _embeddings_file(self, name: str) -> str:
+        return os.path.join(self.index_path, f"{name}.vectors")
+    
+    def _metadata_file(self, name: str) -> str:
+        return os.path.join(self.index_path, f"{name}.metadata.db")
+    
+    def _open_storage(self, reset: bool = False):
+        """Open the metadata database and raw embedding file, starting fresh ones if reset"""
+        if self.metadata is not None:
+            self.metadata.close()
+        if self.embeddings is not None:
+            self.embeddings.close()
+        
+        embeddings_file = self._embeddings_file(self.name)
+        metadata_file = self._metadata_file(self.name)
+        if reset:
+            for path in (embeddings_file, metadata_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        self.metadata = MetadataStore(metadata_file)
+        self.embeddings = EmbeddingSidecar(
+            embeddings_file, self.dimension, self.embedding_dtype, read_only=self.read_only
+        )
+    
+    def _base_index(self) -> faiss.Index:
+        """Underlying index without the ID mapping wrapper"""
+        if isinstance(self.index, faiss.IndexIDMap):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+    
+    @property
+    def total_vectors(self) -> int:
+        """Number of live (non-deleted) vectors"""
+        delta = self.delta_index.ntotal if self.delta_index is not None else 0
+        return self.index.ntotal + delta - len(self.deleted_ids)
+    
+    def _remove_ids(self, ids: np.ndarray) -> int:
+        """Remove IDs from the index without a per-vector scan of the ID list"""
+        if isinstance(self.index, faiss.IndexIVF) and self.index.direct_map.type == faiss.DirectMap.Hashtable:
+            # The hashtable direct map removes by explicit ID list only
+            selector = faiss.IDSelectorArray(ids)
+        else:
+            # Flat codes test every stored vector: IDSelectorBatch answers in O(1),
+            # IDSelectorArray would scan the whole ID list each time
+            selector = faiss.IDSelectorBatch(ids)
+        return self.index.remove_ids(selector)
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyStoreError(
+                f"Vector store {self.index_path} is open read-only; changes go through the writer process"
+            )
+    
+    @_synchronized
     def add_embeddings(self, embeddings: np.ndarray, metadata: List[Dict]) -> List[int]:
         """
         Add embeddings to the index
@@ -45,31 +620,71 @@ class FAISSVectorStore:
         Returns:
             List of assigned IDs
         """
+        self._check_writable()
+        started = time.perf_counter()
         # Normalize embeddings for cosine similarity
         faiss.normalize_L2(embeddings)
         
-        # Add to FAISS index
+        # Keep the raw vectors so the index can be rebuilt without re-embedding.
+        # Vectors are made durable before their metadata is committed, so every
+        # committed row can be replayed after a crash.
         start_id = self.next_id
-        self.index.add(embeddings)
-        
-        # Store metadata
-        ids = []
-        for i, meta in enumerate(metadata):
-            id_val = start_id + i
-            self.id_to_metadata[id_val] = meta
-            self.metadata_to_id[meta['id']] = id_val
-            ids.append(id_val)
+        if self.embeddings is None:
+            self._open_storage(reset=True)
+        ids = np.arange(start_id, start_id + len(embeddings), dtype=np.int64)
+        ntotal = self.index.ntotal
+        try:
+            self.embeddings.append(start_id, embeddings)
+            self.embeddings.flush()
+            
+            # Add to FAISS index
+            self.index.add_with_ids(embeddings, ids)
+            
+            # Store metadata
+            self.metadata.add(ids, metadata)
+        except BaseException:
+            self._undo_add(ids, ntotal)
+            raise
         
         self.next_id += len(embeddings)
+        self._maybe_train()
+        
+        self.pending_changes += len(embeddings)
+        self.maybe_checkpoint()
         
+        self.counters['vectors_added'] += len(embeddings)
+        self.counters['add_seconds'] += time.perf_counter() - started
         logger.info(f"Added {len(embeddings)} embeddings to index. Total: {self.index.ntotal}")
-        return ids
+        return ids.tolist()
+    
+    def _undo_add(self, ids: np.ndarray, ntotal: int):
+        """
+        Roll back a partially applied add_embeddings so its IDs can be reused
+        
+        Args:
+            ids: IDs assigned to the failed batch
+            ntotal: Index size before the batch was added
+        """
+        start_id = int(ids[0])
+        if self.index.ntotal > ntotal:
+            if isinstance(self._base_index(), faiss.IndexHNSW):
+                # Graph nodes cannot be removed: keep the rows, mask the IDs like
+                # deletions and move past them (they have no metadata to return)
+                self.deleted_ids.update(ids.tolist())
+                self.next_id = start_id + len(ids)
+                self.metadata.add_tombstones(ids)
+                return
+            self._remove_ids(ids)
+        # Also drops bytes left behind by an append that failed part-way
+        self.embeddings.truncate(start_id)
     
     def search(
         self,
         query_embedding: np.ndarray,
         top_k: int = 10,
-        document_ids: Optional[List[str]] = None
+        document_ids: Optional[List[str]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
     ) -> List[Dict]:
         """
         Search for similar embeddings
@@ -78,143 +693,997 @@ class FAISSVectorStore:
             query_embedding: Query vector of shape (1, dimension)
             top_k: Number of results to return
             document_ids: Filter by document IDs (optional)
+            nprobe: IVF cells to visit for this query (optional)
+            ef_search: HNSW search depth for this query (optional)
         
         Returns:
             List of results with metadata and scores
         """
-        if self.index.ntotal == 0:
+        return self.search_batch(
+            query_embedding.reshape(1, -1),
+            top_k=top_k,
+            document_ids_per_query=[document_ids],
+            nprobe=nprobe,
+            ef_search=ef_search
+        )[0]
+    
+    @_synchronized
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 10,
+        document_ids_per_query: Optional[List[Optional[List[str]]]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for many queries at once
+        
+        Queries sharing the same document filter go to FAISS as one matrix
+        search, and metadata for all hits is fetched in a single lookup.
+        
+        Args:
+            query_embeddings: Query vectors of shape (n, dimension)
+            top_k: Number of results to return per query
+            document_ids_per_query: Document ID filter for each query (None = no filter)
+            nprobe: IVF cells to visit (optional)
+            ef_search: HNSW search depth (optional)
+        
+        Returns:
+            One list of results (as returned by search) per query
+        """
+        n_queries = len(query_embeddings)
+        self._maybe_refresh()
+        self.counters['searches'] += 1
+        self.counters['search_queries'] += n_queries
+        if self.total_vectors == 0:
             logger.warning("Index is empty")
-            return []
+            return [[] for _ in range(n_queries)]
+        started = time.perf_counter()
         
-        # Normalize query
-        query_embedding = query_embedding.reshape(1, -1)
-        faiss.normalize_L2(query_embedding)
+        # Normalize queries
+        queries = np.ascontiguousarray(query_embeddings.reshape(n_queries, -1), dtype=np.float32)
+        faiss.normalize_L2(queries)
         
-        # Search (get more than top_k for filtering)
-        search_k = min(top_k * 3, self.index.ntotal) if document_ids else top_k
-        scores, indices = self.index.search(query_embedding, search_k)
+        # Group queries by filter so each group is one vectorized search
+        if document_ids_per_query is None:
+            document_ids_per_query = [None] * n_queries
+        groups: Dict[Optional[frozenset], List[int]] = {}
+        for row, document_ids in enumerate(document_ids_per_query):
+            groups.setdefault(frozenset(document_ids) if document_ids else None, []).append(row)
         
-        # Build results
+        all_scores = [np.empty(0, dtype=np.float32)] * n_queries
+        all_indices = [np.empty(0, dtype=np.int64)] * n_queries
+        for document_ids, rows in groups.items():
+            scores, indices = self._search_group(queries[rows], top_k, document_ids, nprobe, ef_search)
+            for i, row in enumerate(rows):
+                all_scores[row], all_indices[row] = scores[i], indices[i]
+        
+        # Build results (metadata is only materialized for the hits)
+        hits = self.metadata.get_many({int(idx) for indices in all_indices for idx in indices if idx != -1})
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx == -1:  # FAISS returns -1 for invalid indices
-                continue
-            
-            metadata = self.id_to_metadata.get(idx, {})
-            
-            # Filter by document_ids if specified
-            if document_ids and metadata.get('document_id') not in document_ids:
-                continue
+        for scores, indices in zip(all_scores, all_indices):
+            query_results = []
+            for score, idx in zip(scores, indices):
+                if idx == -1:  # FAISS returns -1 for invalid indices
+                    continue
+                
+                metadata = hits.get(int(idx))
+                if metadata is None:  # deleted after the index was saved
+                    continue
+                query_results.append({
+                    **metadata,
+                    'score': float(score),
+                    'faiss_id': int(idx)
+                })
+            results.append(query_results)
+        
+        self.counters['search_seconds'] += time.perf_counter() - started
+        return results
+    
+    def _search_group(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        document_ids: Optional[frozenset],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search normalized queries that share one document filter"""
+        # Selectors are referenced, not owned, by the search parameters: keep
+        # them in locals for the whole search and pass them to the parameter
+        # constructors (faiss keeps no reference for `params.sel = ...`)
+        if document_ids:
+            allowed_ids = self._ids_for_documents(document_ids)
+            if len(allowed_ids) == 0:
+                empty = np.empty((len(queries), 0))
+                return empty.astype(np.float32), empty.astype(np.int64)
             
-            results.append({
-                **metadata,
-                'score': float(score),
-                'faiss_id': int(idx)
-            })
+            # Restrict the search to the allowed vectors so every result counts
+            search_k = min(top_k, len(allowed_ids))
+            selector = faiss.IDSelectorBatch(allowed_ids)
+            params = self._search_params(nprobe, ef_search, selector)
+            scores, indices = self._index_search(queries, search_k, params, selector)
             
-            if len(results) >= top_k:
-                break
+            # Approximate indices may miss allowed vectors outside the probed
+            # cells/graph neighbourhood; fall back to an exact scan over them
+            if self.index_type != "flat":
+                short = np.flatnonzero((indices >= 0).sum(axis=1) < search_k)
+                if len(short):
+                    scores[short], indices[short] = self._exact_search(queries[short], allowed_ids, search_k)
+            return scores, indices
         
-        return results
+        search_k = min(top_k, self.total_vectors)
+        deleted = selector = None
+        if self.deleted_ids:
+            deleted = faiss.IDSelectorBatch(np.fromiter(self.deleted_ids, dtype=np.int64))
+            selector = faiss.IDSelectorNot(deleted)
+        params = self._search_params(nprobe, ef_search, selector)
+        return self._index_search(queries, search_k, params, selector)
     
+    def _index_search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        params: faiss.SearchParameters,
+        selector: Optional[faiss.IDSelector] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the index and, on read-only stores, the vectors logged after its snapshot"""
+        scores, indices = self.index.search(queries, k, params=params)
+        if self.delta_index is None:
+            return scores, indices
+        
+        delta_params = faiss.SearchParameters(sel=selector) if selector is not None else None
+        delta_scores, delta_indices = self.delta_index.search(
+            queries, min(k, self.delta_index.ntotal), params=delta_params
+        )
+        scores = np.hstack([scores, delta_scores])
+        indices = np.hstack([indices, delta_indices])
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def _search_params(
+        self,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        selector: Optional[faiss.IDSelector] = None
+    ) -> faiss.SearchParameters:
+        """Build per-query search parameters for the active index, restricted to selector"""
+        options = {'sel': selector} if selector is not None else {}
+        base_index = self._base_index()
+        if isinstance(base_index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, **options)
+        if isinstance(base_index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search, **options)
+        return faiss.SearchParameters(**options)
+    
+    def _exact_search(self, queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force inner product search over a subset of stored vectors"""
+        vectors = self.embeddings.get(ids)
+        scores = queries @ vectors.T
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), ids[order]
+    
+    def _ids_for_documents(self, document_ids: List[str]) -> np.ndarray:
+        """Collect the FAISS IDs belonging to the given documents"""
+        if self.metadata is None:
+            return np.empty(0, dtype=np.int64)
+        return self.metadata.ids_for_documents(document_ids)
+    
+    @_synchronized
     def get_embedding(self, chunk_id: str) -> Optional[np.ndarray]:
-        """Get embedding vector for a chunk ID"""
-        faiss_id = self.metadata_to_id.get(chunk_id)
+        """Get (normalized) embedding vector for a chunk ID"""
+        if self.metadata is None:
+            return None
+        faiss_id = self.metadata.faiss_id(chunk_id)
         if faiss_id is None:
             return None
-        
-        # FAISS doesn't support direct retrieval, so we reconstruct
-        # This is a limitation - in production, store embeddings separately
-        return None
+        return self.embeddings.get([faiss_id])[0]
+    
+    @_synchronized
+    def get_embeddings(self, faiss_ids: List[int]) -> np.ndarray:
+        """Get (normalized) embedding vectors for FAISS IDs, shape (n, dimension)"""
+        if self.embeddings is None:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.embeddings.get(faiss_ids)
     
-    def delete_by_document_id(self, document_id: str):
+    @_synchronized
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict]:
+        """Materialize chunks by chunk ID in search-result form (with faiss_id, without score)"""
+        if self.metadata is None:
+            return []
+        faiss_ids = self.metadata.faiss_ids(chunk_ids)
+        hits = self.metadata.get_many(faiss_ids.values())
+        return [
+            {**hits[faiss_ids[chunk_id]], 'faiss_id': faiss_ids[chunk_id]}
+            for chunk_id in chunk_ids
+            if chunk_id in faiss_ids and faiss_ids[chunk_id] in hits
+        ]
+    
+    def get_result_embeddings(self, results: List[Dict]) -> np.ndarray:
+        """Get (normalized) embedding vectors for search results, in order"""
+        return self.get_embeddings([r['faiss_id'] for r in results])
+    
+    @_synchronized
+    def rebuild_index(self, index_type: Optional[str] = None, **index_options):
         """
-        Delete all embeddings for a document
-        Note: FAISS doesn't support deletion, so we need to rebuild index
+        Rebuild the index from stored embeddings, without re-embedding
+        
+        Retrains IVF centroids on the current corpus, drops HNSW tombstones and
+        can migrate to another backend (e.g. index_type="hnsw", hnsw_m=48).
         """
-        # Filter out embeddings for this document
-        keep_ids = [
-            idx for idx, meta in self.id_to_metadata.items()
-            if meta.get('document_id') != document_id
-        ]
+        self._check_writable()
+        if index_type is not None:
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+            self.index_type = index_type
+        for option, value in index_options.items():
+            if not hasattr(self, option):
+                raise ValueError(f"Unknown index option '{option}'")
+            setattr(self, option, value)
         
-        if len(keep_ids) == len(self.id_to_metadata):
-            logger.info(f"No embeddings found for document {document_id}")
+        live_ids = self.metadata.live_ids() if self.metadata is not None else np.empty(0, dtype=np.int64)
+        logger.info(f"Rebuilding {self.index_type} index from {len(live_ids)} stored embeddings")
+        self.index = self._build_index(live_ids)
+        self.deleted_ids = set()
+        self._applied_tombstones = self.metadata.get_tombstones() if self.metadata is not None else set()
+        self.checkpoint()
+    
+    @_synchronized
+    def compact(self):
+        """
+        Renumber live vectors to 0..n-1 and rewrite the embedding file without
+        deleted rows, then rebuild the index and snapshot it. Changes FAISS IDs.
+        
+        Maintenance operation: not crash-safe between the file rewrite and the
+        final snapshot, so run it with a backup of index_path. Stop reader
+        processes first; they would map renumbered IDs onto their old snapshot.
+        """
+        self._check_writable()
+        if self.embeddings is None:
             return
+        live_ids = self.metadata.live_ids()
+        vectors = self.get_embeddings(live_ids)
+        
+        self.embeddings.close()
+        self.embeddings = EmbeddingSidecar.write(self._embeddings_file(self.name), vectors, self.embeddings.dtype)
+        
+        self.metadata.renumber()
+        self.next_id = len(live_ids)
+        
+        self.index = self._build_index(np.arange(self.next_id, dtype=np.int64))
+        self.deleted_ids = set()
+        self._applied_tombstones = set()
+        self.checkpoint()
+        logger.info(f"Compacted index to {self.next_id} vectors")
+    
+    @_synchronized
+    def delete_by_document_id(self, document_id: str) -> int:
+        """
+        Delete all embeddings for a document
         
-        logger.warning(f"Rebuilding index to remove document {document_id}")
+        Uses the document's posting list, so the bookkeeping is proportional to
+        the document's chunk count. IVF indices remove via their hashtable
+        direct map; HNSW cannot remove graph nodes, so its IDs are tombstoned.
+        Read-only stores only log the tombstones; the writer folds them into
+        its next snapshot.
         
-        # Create new index
-        new_index = faiss.IndexFlatIP(self.dimension)
-        new_id_to_metadata = {}
-        new_metadata_to_id = {}
+        Returns:
+            Number of embeddings removed
+        """
+        ids = self.metadata.delete_document(document_id) if self.metadata is not None else []
+        if len(ids) == 0:
+            logger.info(f"No embeddings found for document {document_id}")
+            return 0
         
-        # This would require re-embedding, which we can't do here
-        # In production, store embeddings separately or use a database that supports deletion
+        if self.read_only:
+            self._replay_log()
+        else:
+            if isinstance(self._base_index(), faiss.IndexHNSW):
+                self.deleted_ids.update(ids.tolist())
+            else:
+                self._remove_ids(ids)
+                self._applied_tombstones.update(ids.tolist())
+            
+            self.pending_changes += len(ids)
+            self.maybe_checkpoint()
         
-        logger.error("FAISS deletion requires re-indexing with original embeddings")
-        raise NotImplementedError("FAISS deletion not implemented - use Milvus or Qdrant for production")
+        self.counters['vectors_deleted'] += len(ids)
+        logger.info(f"Deleted {len(ids)} embeddings for document {document_id}. Total: {self.total_vectors}")
+        return len(ids)
     
-    def save_index(self, name: str = "default"):
-        """Save index and metadata to disk"""
-        index_file = os.path.join(self.index_path, f"{name}.index")
-        metadata_file = os.path.join(self.index_path, f"{name}.meta")
+    def document_version(self, document_ids: Optional[List[str]] = None) -> int:
+        """
+        Change marker for the given documents (all documents when None)
         
-        # Save FAISS index
-        faiss.write_index(self.index, index_file)
+        Read from the shared metadata database, so it also reflects adds and
+        deletes made by other processes before this one has refreshed. Callers
+        compare it for equality; see ResponseCache.lookup.
+        """
+        if self.metadata is None:
+            return 0
+        return self.metadata.document_version(document_ids)
+    
+    def _snapshot_file(self, name: str, generation: int) -> str:
+        return os.path.join(self.index_path, f"{name}-{generation:06d}.index")
+    
+    def _manifest_file(self, name: str) -> str:
+        return os.path.join(self.index_path, f"{name}.manifest.json")
+    
+    def maybe_checkpoint(self):
+        """Snapshot the index once enough changes have been logged since the last one"""
+        threshold = max(self.checkpoint_min_vectors, int(self.checkpoint_ratio * self.snapshot_next_id))
+        if self.pending_changes >= threshold:
+            self.checkpoint()
+    
+    @_synchronized
+    def checkpoint(self):
+        """
+        Write a new index snapshot and atomically publish it
+        
+        The snapshot goes to a new generation file; the manifest is replaced
+        with os.replace, so a crash at any point leaves either the previous or
+        the new snapshot in effect, never a torn file.
+        """
+        self._check_writable()
+        if self.metadata is None:
+            self._open_storage(reset=True)
+        
+        started = time.perf_counter()
+        tombstones = self.metadata.get_tombstones()
+        self._apply_logged_deletes(tombstones)
+        generation = self.snapshot_generation + 1
+        index_file = self._snapshot_file(self.name, generation)
+        _write_atomic(index_file, lambda path: faiss.write_index(self.index, path))
+        self.embeddings.flush()
+        
+        manifest = {
+            'generation': generation,
+            'index_file': os.path.basename(index_file),
+            'next_id': self.next_id,
+            'dimension': self.dimension,
+            'index_type': self.index_type,
+            'index_options': {
+                'nlist': self.nlist,
+                'hnsw_m': self.hnsw_m,
+                'pq_m': self.pq_m,
+                'train_size': self.train_size
+            },
+            'is_trained': self.is_trained
+        }
+        _write_atomic(
+            self._manifest_file(self.name),
+            lambda path: _write_json(path, manifest)
+        )
         
-        # Save metadata
-        with open(metadata_file, 'wb') as f:
-            pickle.dump({
-                'id_to_metadata': self.id_to_metadata,
-                'metadata_to_id': self.metadata_to_id,
-                'next_id': self.next_id
-            }, f)
+        # Removals are now part of the snapshot (HNSW keeps its tombstones until
+        # compaction). Only clear what was read above: readers may have logged more.
+        if not isinstance(self._base_index(), faiss.IndexHNSW):
+            self.metadata.clear_tombstones(tombstones)
+            self._applied_tombstones = set()
+        
+        # Drop older generations and leftovers of interrupted checkpoints
+        for path in glob.glob(os.path.join(self.index_path, f"{glob.escape(self.name)}-*.index*")):
+            if path != index_file:
+                os.remove(path)
+        
+        self.snapshot_generation = generation
+        self.snapshot_next_id = self.next_id
+        self.pending_changes = 0
+        self.counters['checkpoints'] += 1
+        self.counters['checkpoint_seconds'] += time.perf_counter() - started
+        logger.info(f"Checkpointed index to {index_file} ({self.total_vectors} vectors)")
+    
+    def _apply_logged_deletes(self, tombstones: set):
+        """Remove (or mask) IDs that reader processes deleted through the metadata log"""
+        new_ids = tombstones - self._applied_tombstones - self.deleted_ids
+        if not new_ids:
+            return
+        logger.info(f"Applying {len(new_ids)} deletions logged by other processes")
+        if isinstance(self._base_index(), faiss.IndexHNSW):
+            self.deleted_ids.update(new_ids)
+        else:
+            self._remove_ids(np.fromiter(new_ids, dtype=np.int64))
+            self._applied_tombstones.update(new_ids)
+    
+    @_synchronized
+    def save_index(self, name: Optional[str] = None):
+        """
+        Save index and metadata to disk
+        
+        Adds and deletes are persisted as they happen, so this only forces a
+        snapshot. Saving under another name exports a copy of the store.
+        """
+        self.checkpoint()
+        name = name or self.name
+        if name == self.name:
+            return
         
-        logger.info(f"Saved index to {index_file}")
+        shutil.copyfile(
+            self._snapshot_file(self.name, self.snapshot_generation),
+            self._snapshot_file(name, self.snapshot_generation)
+        )
+        shutil.copyfile(self._manifest_file(self.name), self._manifest_file(name))
+        shutil.copyfile(self.embeddings.path, self._embeddings_file(name))
+        self.metadata.backup_to(self._metadata_file(name))
+        logger.info(f"Exported index {self.name} as {name}")
     
-    def load_index(self, name: str = "default") -> bool:
-        """Load index and metadata from disk"""
-        index_file = os.path.join(self.index_path, f"{name}.index")
-        metadata_file = os.path.join(self.index_path, f"{name}.meta")
+    @_synchronized
+    def load_index(self, name: Optional[str] = None) -> bool:
+        """
+        Load the latest snapshot and replay changes logged after it
         
-        if not os.path.exists(index_file) or not os.path.exists(metadata_file):
-            logger.warning(f"Index files not found: {name}")
+        Vectors added after the snapshot are re-added from the embedding file
+        (only those whose metadata was committed), and deletions recorded as
+        tombstones are re-applied. Read-only stores memory-map the snapshot
+        (shared with every other process mapping it) and keep the logged
+        vectors in a private flat index instead.
+        """
+        name = name or self.name
+        manifest_file = self._manifest_file(name)
+        legacy_index_file = os.path.join(self.index_path, f"{name}.index")
+        legacy_metadata_file = os.path.join(self.index_path, f"{name}.meta")
+        
+        signature = None
+        if os.path.exists(manifest_file):
+            signature = _file_signature(manifest_file)
+            with open(manifest_file) as f:
+                state = json.load(f)
+            index_file = os.path.join(self.index_path, state['index_file'])
+        elif self.read_only:
+            # Legacy stores are upgraded by the writer's first load
+            logger.warning(f"No snapshot of {name} to map yet")
             return False
+        else:
+            # Stores saved before snapshots: {name}.index with SQLite or pickled metadata
+            state = None
+            index_file = legacy_index_file
+            has_metadata = os.path.exists(self._metadata_file(name)) or os.path.exists(legacy_metadata_file)
+            if not os.path.exists(index_file) or not has_metadata:
+                logger.warning(f"Index files not found: {name}")
+                return False
         
         # Load FAISS index
-        self.index = faiss.read_index(index_file)
+        if self.read_only:
+            try:
+                self.index = faiss.read_index(index_file, self._mmap_flags(state))
+            except RuntimeError:
+                # The writer published a newer snapshot and removed this one meanwhile
+                if _file_signature(manifest_file) != signature:
+                    return self.load_index(name)
+                raise
+        else:
+            self.index = faiss.read_index(index_file)
+        
+        # Open metadata (constant time; rows stay on disk)
+        self.name = name
+        self._open_storage()
+        if state is None:
+            state = self.metadata.get_state()
+            if not state and os.path.exists(legacy_metadata_file):
+                state = self._import_legacy_metadata(legacy_metadata_file)
+        
+        self.snapshot_generation = state.get('generation', 0)
+        self.snapshot_next_id = state['next_id']
+        # Indices saved before index_type was recorded are always flat
+        self.index_type = state.get('index_type', 'flat')
+        for option, value in state.get('index_options', {}).items():
+            setattr(self, option, value)
+        self.is_trained = state.get('is_trained', True)
+        
+        self._upgrade_legacy_index()
+        
+        self.next_id = self.snapshot_next_id
+        if self.embeddings.rows < self.next_id and not self.read_only:
+            self._backfill_embeddings()
+        self._replay_log()
+        self._manifest_signature = signature
+        
+        logger.info(f"Loaded index from {index_file}. Total vectors: {self.total_vectors}")
+        return True
+    
+    def _mmap_flags(self, state: Dict) -> int:
+        """FAISS IO flags that map a snapshot read-only instead of copying it into memory"""
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        if self._needs_training() and state.get('is_trained', True):
+            # IVF inverted lists are mapped as OnDiskInvertedLists
+            return flags
+        # Flat codes (flat, HNSW storage, IVF staging) need IO_FLAG_MMAP_IFC (faiss >= 1.11)
+        if not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+            logger.warning(
+                f"faiss {faiss.__version__} cannot memory-map flat codes: {self.index_path} is loaded "
+                "into private memory in every process (only trained IVF indices are shared)"
+            )
+            return faiss.IO_FLAG_READ_ONLY
+        return faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP_IFC
+    
+    def _replay_log(self):
+        """Re-apply adds and deletes made after the snapshot was written"""
+        if self.read_only:
+            # Changes committed by others after this point show up as a new data_version
+            self._data_version = self.metadata.data_version()
+        
+        tail_ids = self.metadata.live_ids(self.snapshot_next_id)
+        if self.read_only:
+            # The mapped snapshot cannot be added to; logged vectors get a private index
+            self.embeddings.refresh()
+            self.delta_index = None
+            if len(tail_ids):
+                self.delta_index = self._create_staging_index()
+                self.delta_index.add_with_ids(self.embeddings.get(tail_ids), tail_ids)
+        elif len(tail_ids):
+            logger.info(f"Replaying {len(tail_ids)} embeddings logged after snapshot")
+            self.index.add_with_ids(self.embeddings.get(tail_ids), tail_ids)
+            self._maybe_train()
+        
+        logged_tombstones = self.metadata.get_tombstones()
+        tombstones = np.fromiter(
+            (i for i in logged_tombstones if i < self.snapshot_next_id), dtype=np.int64
+        )
+        if self.read_only or isinstance(self._base_index(), faiss.IndexHNSW):
+            self.deleted_ids = set(tombstones.tolist())
+        else:
+            self.deleted_ids = set()
+            if len(tombstones):
+                self._remove_ids(tombstones)
+        # Tombstones past the snapshot belong to vectors that were not replayed
+        self._applied_tombstones = logged_tombstones - self.deleted_ids
+        
+        # Rows without committed metadata (a crash mid-add) stay as dead rows
+        self.next_id = max(self.snapshot_next_id, self.embeddings.rows)
+        self.pending_changes = len(tail_ids) + len(tombstones)
+    
+    def _maybe_refresh(self):
+        if self.read_only and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+    
+    @_synchronized
+    def refresh(self) -> bool:
+        """
+        Catch a read-only store up with the writer process
         
-        # Load metadata
+        Cheap when nothing changed: one stat of the manifest and one SQLite
+        pragma. Vectors and deletions logged since the mapped snapshot are
+        picked up from the metadata database; a newer snapshot is mapped in
+        place of the current one.
+        
+        Returns:
+            True if the store's view changed
+        """
+        self._last_refresh = time.monotonic()
+        changed = False
+        # Read the log before the manifest: the writer publishes a snapshot
+        # before clearing the tombstones it absorbed
+        if self.metadata is not None and self.metadata.data_version() != self._data_version:
+            self._replay_log()
+            changed = True
+        
+        manifest_file = self._manifest_file(self.name)
+        if os.path.exists(manifest_file) and _file_signature(manifest_file) != self._manifest_signature:
+            self.load_index()
+            self.counters['snapshot_reloads'] += 1
+            logger.info(f"Mapped snapshot generation {self.snapshot_generation} of {self.name}")
+            changed = True
+        return changed
+    
+    def _import_legacy_metadata(self, metadata_file: str) -> Dict:
+        """One-off import of a pickled .meta file into the metadata database"""
+        logger.info(f"Importing legacy metadata from {metadata_file}")
         with open(metadata_file, 'rb') as f:
             data = pickle.load(f)
-            self.id_to_metadata = data['id_to_metadata']
-            self.metadata_to_id = data['metadata_to_id']
-            self.next_id = data['next_id']
         
-        logger.info(f"Loaded index from {index_file}. Total vectors: {self.index.ntotal}")
-        return True
+        id_to_metadata = data['id_to_metadata']
+        ids = sorted(id_to_metadata)
+        self.metadata.add(ids, [id_to_metadata[idx] for idx in ids])
+        self.metadata.set_tombstones(data.get('deleted_ids', set()))
+        
+        state = {k: v for k, v in data.items() if k not in ('id_to_metadata', 'metadata_to_id', 'deleted_ids')}
+        self.metadata.set_state(state)
+        self.metadata.commit()
+        return state
     
+    def _upgrade_legacy_index(self):
+        """Move indices saved with positional IDs onto external ID mapping"""
+        if isinstance(self.index, faiss.IndexIVF):
+            if self.index.direct_map.type != faiss.DirectMap.Hashtable:
+                self.index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return
+        if isinstance(self.index, faiss.IndexIDMap):
+            return
+        
+        # Positional indices used insertion order as ID, so ids are 0..ntotal-1
+        logger.info(f"Migrating {type(self.index).__name__} to IndexIDMap2")
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        self.index = self._create_index() if self.is_trained else self._create_staging_index()
+        if len(vectors):
+            self.index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    
+    def _backfill_embeddings(self):
+        """Recover raw embeddings missing from the embedding file from the index"""
+        start_id = self.embeddings.rows
+        logger.info(f"Backfilling embeddings {start_id}..{self.next_id} from index")
+        vectors = np.zeros((self.next_id - start_id, self.dimension), dtype=np.float32)
+        for idx in self.metadata.live_ids(start_id):
+            vectors[idx - start_id] = self.index.reconstruct(int(idx))
+        self.embeddings.append(start_id, vectors)
+        self.embeddings.flush()
+    
+    @_synchronized
     def get_stats(self) -> Dict:
         """Get index statistics"""
+        self._maybe_refresh()
         return {
-            'total_vectors': self.index.ntotal,
+            'total_vectors': self.total_vectors,
             'dimension': self.dimension,
-            'index_type': 'IndexFlatIP',
-            'documents': len(set(
-                meta.get('document_id') for meta in self.id_to_metadata.values()
-            ))
+            'index_type': type(self._base_index()).__name__,
+            'index_spec': self.index_type,
+            'is_trained': self.is_trained,
+            'embedding_rows': self.embeddings.rows if self.embeddings is not None else 0,
+            'embedding_dtype': str(self.embeddings.dtype) if self.embeddings is not None else self.embedding_dtype,
+            'documents': self.metadata.document_count() if self.metadata is not None else 0,
+            'read_only': self.read_only,
+            'snapshot_generation': self.snapshot_generation
+        }
+    
+    def get_counters(self) -> Dict:
+        """Operation counters plus current sizes, cheap enough to read on every metrics scrape"""
+        return {
+            **self.counters,
+            'total_vectors': self.total_vectors,
+            'pending_changes': self.pending_changes,
+            'snapshot_generation': self.snapshot_generation
+        }
+
+
+class ShardedVectorStore:
+    """
+    Vector store partitioned into independent FAISSVectorStore shards
+    
+    Each shard lives in its own directory under index_path and can be loaded
+    or unloaded on its own. Searches fan out to the relevant shards on a
+    thread pool (FAISS releases the GIL) and results are merged with a heap.
+    """
+    
+    PARTITIONS = ("document_id", "document_type")
+    
+    def __init__(
+        self,
+        dimension: int = 1536,
+        index_path: str = "./data/faiss_indices",
+        num_shards: int = 8,
+        partition_by: str = "document_id",
+        max_workers: Optional[int] = None,
+        **index_options
+    ):
+        """
+        Initialize sharded vector store
+        
+        Args:
+            dimension: Embedding dimension
+            index_path: Directory holding one sub-directory per shard
+            num_shards: Number of hash partitions (partition_by="document_id")
+            partition_by: document_id (hash) or document_type (one shard per type)
+            max_workers: Search fan-out threads (defaults to the shard count)
+            **index_options: Passed to each FAISSVectorStore shard
+        """
+        if partition_by not in self.PARTITIONS:
+            raise ValueError(f"Unknown partitioning '{partition_by}', expected one of {self.PARTITIONS}")
+        
+        self.dimension = dimension
+        self.index_path = index_path
+        self.num_shards = num_shards
+        self.partition_by = partition_by
+        self.index_options = index_options
+        self.read_only = index_options.get('read_only', False)
+        os.makedirs(index_path, exist_ok=True)
+        
+        self.shards: Dict[str, FAISSVectorStore] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(num_shards, 4),
+            thread_name_prefix="vector-shard"
+        )
+    
+    def shard_name(self, document_id: str, document_type: Optional[str] = None) -> str:
+        """Shard a document belongs to"""
+        if self.partition_by == "document_type":
+            safe_type = "".join(ch if ch.isalnum() else "_" for ch in (document_type or "general"))
+            return f"type-{safe_type}"
+        # crc32 rather than hash(): stable across processes and restarts
+        return f"shard-{zlib.crc32(document_id.encode()) % self.num_shards:03d}"
+    
+    def shard_names_on_disk(self) -> List[str]:
+        return sorted(
+            entry for entry in os.listdir(self.index_path)
+            if os.path.isdir(os.path.join(self.index_path, entry))
+        )
+    
+    def get_shard(self, name: str, create: bool = True) -> Optional[FAISSVectorStore]:
+        """Return a loaded shard, loading it from disk (or creating it) on first use"""
+        with self._lock:
+            shard = self.shards.get(name)
+            if shard is not None:
+                return shard
+            loading_lock = self._loading.setdefault(name, threading.Lock())
+        
+        # Load outside the store lock so different shards load in parallel
+        with loading_lock:
+            shard = self.shards.get(name)
+            if shard is None:
+                shard_path = os.path.join(self.index_path, name)
+                if not create and not os.path.isdir(shard_path):
+                    return None
+                shard = FAISSVectorStore(self.dimension, shard_path, **self.index_options)
+                shard.load_index()
+                with self._lock:
+                    self.shards[name] = shard
+        return shard
+    
+    def load_index(self) -> bool:
+        """Load every shard found on disk, in parallel"""
+        names = self.shard_names_on_disk()
+        list(self._executor.map(lambda name: self.get_shard(name), names))
+        logger.info(f"Loaded {len(names)} shards from {self.index_path}")
+        return bool(names)
+    
+    @_synchronized
+    def unload_shard(self, name: str):
+        """Snapshot a shard and release its memory"""
+        shard = self.shards.pop(name, None)
+        if shard is not None and not self.read_only:
+            shard.checkpoint()
+    
+    def add_embeddings(self, embeddings: np.ndarray, metadata: List[Dict]) -> List[int]:
+        """
+        Add embeddings, routing each row to its shard
+        
+        Returns:
+            Assigned IDs (local to each row's shard, see the `shard` metadata key)
+        """
+        rows_by_shard: Dict[str, List[int]] = {}
+        for row, meta in enumerate(metadata):
+            name = self.shard_name(meta['document_id'], meta.get('document_type'))
+            rows_by_shard.setdefault(name, []).append(row)
+        
+        ids = [0] * len(metadata)
+        for name, rows in rows_by_shard.items():
+            shard_metadata = [{**metadata[row], 'shard': name} for row in rows]
+            shard_ids = self.get_shard(name).add_embeddings(embeddings[rows], shard_metadata)
+            for row, idx in zip(rows, shard_ids):
+                ids[row] = idx
+        return ids
+    
+    def _shards_for(self, document_ids_per_query: List[Optional[List[str]]]) -> List[FAISSVectorStore]:
+        """Shards that can hold results for the given filters"""
+        if self.partition_by == "document_id" and all(document_ids_per_query):
+            names = {
+                self.shard_name(document_id)
+                for document_ids in document_ids_per_query for document_id in document_ids
+            }
+        else:
+            names = set(self.shard_names_on_disk()) | set(self.shards)
+        return [shard for shard in (self.get_shard(name, create=False) for name in sorted(names)) if shard]
+    
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        document_ids: Optional[List[str]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[Dict]:
+        """Search all relevant shards (see FAISSVectorStore.search)"""
+        return self.search_batch(
+            query_embedding.reshape(1, -1),
+            top_k=top_k,
+            document_ids_per_query=[document_ids],
+            nprobe=nprobe,
+            ef_search=ef_search
+        )[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 10,
+        document_ids_per_query: Optional[List[Optional[List[str]]]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """Fan a batch of queries out to the relevant shards and merge the top_k"""
+        n_queries = len(query_embeddings)
+        queries = np.ascontiguousarray(query_embeddings.reshape(n_queries, -1), dtype=np.float32)
+        if document_ids_per_query is None:
+            document_ids_per_query = [None] * n_queries
+        
+        shards = self._shards_for(document_ids_per_query)
+        if not shards:
+            return [[] for _ in range(n_queries)]
+        
+        # Each shard normalizes its own copy of the queries
+        shard_results = list(self._executor.map(
+            lambda shard: shard.search_batch(queries.copy(), top_k, document_ids_per_query, nprobe, ef_search),
+            shards
+        ))
+        return [
+            heapq.nlargest(top_k, (r for results in shard_results for r in results[i]), key=lambda r: r['score'])
+            for i in range(n_queries)
+        ]
+    
+    def get_embedding(self, chunk_id: str) -> Optional[np.ndarray]:
+        """Get embedding vector for a chunk ID from whichever shard holds it"""
+        for shard in list(self.shards.values()):
+            embedding = shard.get_embedding(chunk_id)
+            if embedding is not None:
+                return embedding
+        return None
+    
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict]:
+        """Materialize chunks by chunk ID from whichever shards hold them"""
+        found = {}
+        for name in self.shard_names_on_disk():
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+            if not missing:
+                break
+            for chunk in self.get_shard(name).get_chunks(missing):
+                found[chunk['id']] = chunk
+        return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
+    
+    def get_result_embeddings(self, results: List[Dict]) -> np.ndarray:
+        """Get embedding vectors for search results, in order (FAISS IDs are per shard)"""
+        embeddings = np.zeros((len(results), self.dimension), dtype=np.float32)
+        by_shard: Dict[str, List[int]] = {}
+        for row, result in enumerate(results):
+            by_shard.setdefault(result['shard'], []).append(row)
+        for name, rows in by_shard.items():
+            shard = self.get_shard(name, create=False)
+            if shard is not None:
+                embeddings[rows] = shard.get_embeddings([results[row]['faiss_id'] for row in rows])
+        return embeddings
+    
+    def delete_by_document_id(self, document_id: str) -> int:
+        """Delete all embeddings for a document from its shard(s)"""
+        if self.partition_by == "document_id":
+            shard = self.get_shard(self.shard_name(document_id), create=False)
+            return shard.delete_by_document_id(document_id) if shard else 0
+        # Type partitions do not know a document's type here; ask every shard
+        return sum(
+            shard.delete_by_document_id(document_id)
+            for shard in (self.get_shard(name) for name in self.shard_names_on_disk())
+        )
+    
+    def document_version(self, document_ids: Optional[List[str]] = None) -> int:
+        """Change marker summed over the shards that can hold the documents"""
+        return sum(shard.document_version(document_ids) for shard in self._shards_for([document_ids]))
+    
+    def checkpoint(self):
+        """Snapshot every loaded shard"""
+        list(self._executor.map(lambda shard: shard.checkpoint(), list(self.shards.values())))
+    
+    def save_index(self):
+        self.checkpoint()
+    
+    def get_stats(self) -> Dict:
+        """Get statistics aggregated over loaded shards"""
+        shard_stats = {name: shard.get_stats() for name, shard in list(self.shards.items())}
+        return {
+            'total_vectors': sum(s['total_vectors'] for s in shard_stats.values()),
+            'dimension': self.dimension,
+            'index_type': 'sharded',
+            'partition_by': self.partition_by,
+            'shards_loaded': len(shard_stats),
+            'shards_on_disk': len(self.shard_names_on_disk()),
+            'documents': sum(s['documents'] for s in shard_stats.values()),
+            'read_only': self.read_only,
+            'shards': shard_stats
         }
+    
+    def get_counters(self) -> Dict:
+        """Counters summed over loaded shards"""
+        totals: Dict = {'shards_loaded': 0}
+        for shard in list(self.shards.values()):
+            totals['shards_loaded'] += 1
+            for name, value in shard.get_counters().items():
+                if name != 'snapshot_generation':
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+def _write_atomic(path: str, write):
+    """Write a file via a temporary path, fsync it and rename it into place"""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    """Identity of a file version (files are replaced atomically, so a new version is a new inode)"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _write_json(path: str, data: Dict):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def acquire_writer_lock(index_path: str) -> Optional[int]:
+    """
+    Try to become the single writer of the stores under index_path
+    
+    The lock is an flock on {index_path}/writer.lock, released by the kernel
+    when the holding process exits, so a crashed writer never leaves it stale.
+    
+    Returns:
+        The lock file descriptor (keep it open), or None if another process holds the lock
+    """
+    os.makedirs(index_path, exist_ok=True)
+    fd = os.open(os.path.join(index_path, "writer.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    # Record the holder for whoever is debugging a stuck deployment
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    return fd
 
 
 # Singleton instance
 vector_store = None
+writer_lock = None
 
-def get_vector_store(dimension: int = 1536, index_path: str = "./data/faiss_indices") -> FAISSVectorStore:
-    """Get or create vector store instance"""
-    global vector_store
+def get_vector_store(
+    dimension: int = 1536,
+    index_path: str = "./data/faiss_indices",
+    index_type: str = "flat",
+    num_shards: int = 1,
+    partition_by: str = "document_id",
+    mode: str = "writer",
+    load: bool = True,
+    **index_options
+):
+    """
+    Get or create vector store instance (sharded when num_shards > 1 or partitioned by type)
+    
+    Args:
+        mode: writer (fails if another process writes index_path), reader
+            (read-only, shares the writer's snapshots via mmap) or auto
+            (writer if the writer lock is free, else reader; one per
+            web worker process)
+        load: Load the persisted index now; pass False to call load_index()
+            later (e.g. off the event loop)
+    """
+    global vector_store, writer_lock
     if vector_store is None:
-        vector_store = FAISSVectorStore(dimension, index_path)
+        if mode not in STORE_MODES:
+            raise ValueError(f"Unknown vector store mode '{mode}', expected one of {STORE_MODES}")
+        read_only = mode == "reader"
+        if not read_only:
+            writer_lock = acquire_writer_lock(index_path)
+            if writer_lock is None:
+                if mode == "writer":
+                    raise RuntimeError(f"Another process holds the writer lock on {index_path}")
+                read_only = True
+        logger.info(f"Opening vector store in {index_path} as {'reader' if read_only else 'writer'}")
+        index_options['read_only'] = read_only
+        
+        if num_shards > 1 or partition_by != "document_id":
+            vector_store = ShardedVectorStore(
+                dimension, index_path, num_shards=num_shards, partition_by=partition_by,
+                index_type=index_type, **index_options
+            )
+        else:
+            vector_store = FAISSVectorStore(dimension, index_path, index_type=index_type, **index_options)
         # Try to load existing index
-        vector_store.load_index()
+        if load:
+            vector_store.load_index()
     return vector_store